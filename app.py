@@ -1,6 +1,11 @@
 import streamlit as st
-from web_search import WebSearch
+from web_search import WebSearch, SOURCES
 from gemini_api import GeminiAPI
+from summarizer import Summarizer
+from findings import FindingsIndex, DEFAULT_MAX_AGE_DAYS, DEFAULT_MIN_RESULTS
+from deadline import Deadline
+from dedup import deduplicate
+from ranking import rank_results
 import time
 from datetime import datetime
 import docx
@@ -51,10 +56,30 @@ if 'search_results' not in st.session_state:
     st.session_state.search_results = None
 if 'agent_thoughts' not in st.session_state:
     st.session_state.agent_thoughts = []
+if 'query' not in st.session_state:
+    st.session_state.query = None
+if 'docx_bytes' not in st.session_state:
+    st.session_state.docx_bytes = None
+if 'summaries' not in st.session_state:
+    st.session_state.summaries = {}
 
-# Initialize components
-web_search = WebSearch()
-gemini_api = GeminiAPI()
+# Initialize components once per server process; Streamlit reruns this
+# script on every interaction, so the clients are cached across reruns
+@st.cache_resource
+def get_web_search():
+    return WebSearch()
+
+@st.cache_resource
+def get_gemini_api():
+    return GeminiAPI()
+
+@st.cache_resource
+def get_summarizer():
+    return Summarizer(gemini=get_gemini_api())
+
+@st.cache_resource
+def get_findings_index():
+    return FindingsIndex()
 
 def create_word_document(results, query):
     """Create a Word document with research results."""
@@ -98,12 +123,74 @@ def display_search_results(results):
     
     for idx, result in enumerate(results, 1):
         with st.expander(f"{idx}. {result['title']}"):
-            st.markdown(f"**Source:** {result['source'].upper()}")
+            sources = result.get('sources', [result['source']])
+            st.markdown(f"**Source:** {', '.join(source.upper() for source in sources)}")
             st.markdown(f"**URL:** [{result['url']}]({result['url']})")
+            record = st.session_state.summaries.get(result['url'])
+            if record:
+                st.markdown("**AI Summary:**")
+                st.markdown(record['summary'])
+                st.markdown("**Key Points:**")
+                st.markdown('\n'.join(f"- {point}" for point in record['key_points']))
             st.markdown("**Snippet:**")
             st.markdown(result['snippet'][:500] + "..." if len(result['snippet']) > 500 else result['snippet'])
 
+def display_source_progress(results_by_source, sources=SOURCES):
+    """Display results grouped by source as each source completes."""
+    st.markdown("### 📡 Live Results")
+    for source in sources:
+        if source not in results_by_source:
+            st.markdown(f"⏳ **{source.upper()}** — searching...")
+            continue
+        source_results = results_by_source[source]
+        with st.expander(f"✅ {source.upper()} — {len(source_results)} results", expanded=False):
+            for result in source_results:
+                st.markdown(f"- [{result['title']}]({result['url']})")
+
+def stream_summaries(summarizer, results, area, index=None, query=None, deadline=None):
+    """Render each summary in place as the model writes it; return the finished records by URL.
+    
+    Finished records are added to the findings index, if one is given.
+    Results the deadline left no time to summarize only show their snippet.
+    """
+    records = {}
+    with area.container():
+        st.markdown("### 📝 Summaries")
+        for kind, payload in summarizer.stream_search_results(results, deadline=deadline):
+            if kind == "result":
+                st.markdown(f"**{payload['title']}**")
+                placeholder = st.empty()
+                text = ""
+            elif kind == "text":
+                text += payload
+                placeholder.markdown(text)
+            elif payload and not payload.get('snippet_only'):
+                records[payload['url']] = payload
+                if index is not None:
+                    index.add(payload, query)
+    return records
+
+def display_docx_export(results, query):
+    """Build the Word document only when the user asks for it."""
+    if st.button("📄 Prepare Word document"):
+        doc = create_word_document(results, query)
+        docx_bytes = io.BytesIO()
+        doc.save(docx_bytes)
+        st.session_state.docx_bytes = docx_bytes.getvalue()
+    
+    if st.session_state.docx_bytes:
+        st.download_button(
+            label="📥 Download Research Documentation (Word)",
+            data=st.session_state.docx_bytes,
+            file_name="crossdomain_researchdocumentation.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
 def main():
+    web_search = get_web_search()
+    summarizer = get_summarizer()
+    findings_index = get_findings_index()
+    
     st.title("🤖 SageScope AI Research Agent")
     st.markdown("An autonomous research agent powered by Gemini Pro")
     
@@ -113,7 +200,22 @@ def main():
         
         # Research Settings
         st.markdown("### ⚙️ Research Settings")
+        selected_sources = st.multiselect("Sources", SOURCES, default=SOURCES,
+                                          help="Only the selected sources are queried")
         max_results = st.slider("Maximum results per source", 1, 10, 5)
+        top_k = st.slider("Most relevant results to keep", 1, 50, 15,
+                          help="Results are ranked by relevance to the query and only the best ones are kept")
+        summarize_top = st.slider("Results to summarize", 0, 10, 3,
+                                  help="Summaries of the most relevant results appear as the model writes them")
+        from_index = st.checkbox("Answer from past research first", value=False,
+                                 help=f"Show matching findings of earlier runs instantly; live sources are skipped "
+                                      f"when at least {DEFAULT_MIN_RESULTS} are found")
+        deadline_seconds = st.number_input("Deadline (seconds)", min_value=0, max_value=600, value=0, step=5,
+                                           help="Answer within this time (0 for no deadline). Slow sources are "
+                                                "cancelled and snippets replace page text and summaries as time runs out")
+        use_cache = st.checkbox("Use cached search results", value=True)
+        refresh_cache = st.checkbox("Refresh cache", value=False, disabled=not use_cache,
+                                    help="Query every source again and update the cached results")
         
         # About SageScope
         st.markdown("### ℹ️ About SageScope")
@@ -170,18 +272,59 @@ def main():
         if not query:
             st.error("Please enter a research query")
             return
+        if not selected_sources:
+            st.error("Please select at least one source")
+            return
+        
+        thoughts_area = st.empty()
+        progress_area = st.empty()
+        
+        def show_thoughts():
+            with thoughts_area.container():
+                display_agent_thoughts(st.session_state.agent_thoughts)
             
         with st.spinner("Agent is researching..."):
+            deadline = Deadline(deadline_seconds) if deadline_seconds else None
+            
             # Agent's initial thought
             st.session_state.agent_thoughts.append(f"🤔 Analyzing query: '{query}'")
-            display_agent_thoughts(st.session_state.agent_thoughts)
             
-            # Search across sources
-            st.session_state.agent_thoughts.append("🔍 Searching across multiple sources...")
-            display_agent_thoughts(st.session_state.agent_thoughts)
+            # Prior findings come back from the local index in milliseconds
+            prior = []
+            if from_index:
+                lookup_start = time.perf_counter()
+                prior = findings_index.search(query, limit=top_k, max_age=DEFAULT_MAX_AGE_DAYS * 86400)
+                st.session_state.agent_thoughts.append(
+                    f"📚 Found {len(prior)} findings from earlier research in {(time.perf_counter() - lookup_start) * 1000:.0f} ms")
+                show_thoughts()
+            summaries = {record['url']: record for record in prior}
+            results = [dict(record, snippet=record['summary']) for record in prior]
+            
+            if len(prior) < DEFAULT_MIN_RESULTS or not from_index:
+                # Search across sources
+                st.session_state.agent_thoughts.append("🔍 Searching across multiple sources...")
+                show_thoughts()
+                
+                # Render each source as soon as it answers instead of waiting for the slowest
+                # The WebSearch is shared across sessions, so the cache mode goes with the call
+                cache_mode = ("refresh" if refresh_cache else "use") if use_cache else "bypass"
+                results_by_source = {}
+                for source, source_results in web_search.iter_search(query, max_results, sources=selected_sources,
+                                                                   deadline=deadline, cache_mode=cache_mode):
+                    results_by_source[source] = source_results
+                    with progress_area.container():
+                        display_source_progress(results_by_source, selected_sources)
+                
+                live = [result for source in SOURCES for result in results_by_source.get(source, [])]
+                live = deduplicate(live)
+                live = [result for result in rank_results(query, live, top_k) if result['url'] not in summaries]
+                results = (results + live)[:max(top_k, len(prior))]
+                progress_area.empty()
             
-            results = web_search.search_all(query, max_results)
             st.session_state.search_results = results
+            st.session_state.query = query
+            st.session_state.docx_bytes = None
+            st.session_state.summaries = summaries
             
             if not st.session_state.search_results:
                 st.error("No results found. Please try a different query.")
@@ -189,30 +332,37 @@ def main():
             
             # Agent's analysis
             st.session_state.agent_thoughts.append(f"📊 Found {len(results)} relevant sources")
-            display_agent_thoughts(st.session_state.agent_thoughts)
-            
-            # Display search results
-            display_search_results(st.session_state.search_results)
             
-            # Create and save Word document
-            doc = create_word_document(results, query)
+            if summarize_top:
+                # Only summarize top results that have no fresh finding in the index yet
+                to_summarize = []
+                for result in results[:summarize_top]:
+                    known = findings_index.get(result['url'], max_age=DEFAULT_MAX_AGE_DAYS * 86400) if from_index else None
+                    if known is None:
+                        to_summarize.append(result)
+                    else:
+                        summaries[result['url']] = known
+                if to_summarize:
+                    st.session_state.agent_thoughts.append(f"📝 Summarizing the top {len(to_summarize)} sources...")
+                    show_thoughts()
+                    summaries.update(stream_summaries(summarizer, to_summarize, progress_area, findings_index, query,
+                                                      deadline))
+                    progress_area.empty()
             
-            # Save to bytes
-            docx_bytes = io.BytesIO()
-            doc.save(docx_bytes)
-            docx_bytes.seek(0)
-            
-            # Create download button
-            st.download_button(
-                label="📥 Download Research Documentation (Word)",
-                data=docx_bytes,
-                file_name="crossdomain_researchdocumentation.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
+            if deadline is not None and deadline.notes():
+                st.session_state.agent_thoughts.append(
+                    f"⏱️ To answer within {deadline_seconds} s: " + "; ".join(deadline.notes()))
             
             # Agent's final thoughts
-            st.session_state.agent_thoughts.append("💡 Research complete. You can now explore the results above and download the documentation.")
-            display_agent_thoughts(st.session_state.agent_thoughts)
+            st.session_state.agent_thoughts.append("💡 Research complete. You can now explore the results below and download the documentation.")
+            show_thoughts()
+    elif st.session_state.agent_thoughts:
+        display_agent_thoughts(st.session_state.agent_thoughts)
+    
+    # Results persist across reruns, e.g. when the export button is clicked
+    if st.session_state.search_results:
+        display_search_results(st.session_state.search_results)
+        display_docx_export(st.session_state.search_results, st.session_state.query)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
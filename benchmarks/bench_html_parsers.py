@@ -0,0 +1,53 @@
+"""Micro-benchmark of the HTML text extraction backends.
+
+Runs extract_text over the saved pages in benchmarks/fixtures with every
+installed parser backend and reports the median time per page.
+
+Usage:
+    python benchmarks/bench_html_parsers.py [--repeat N]
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extract import available_parsers, extract_text
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def time_parser(html: str, parser: str, repeat: int) -> float:
+    """Return the median wall time in seconds of extracting text from html."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract_text(html, parser)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML parser backends')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per fixture and parser')
+    args = parser.parse_args()
+
+    parsers = available_parsers()
+    print(f"Parsers: {', '.join(parsers)}\n")
+    print(f"{'fixture':<24}{'size':>10}  " + ''.join(f"{name:>14}" for name in parsers) + f"{'speedup':>10}")
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        timings = {name: time_parser(html, name, args.repeat) for name in parsers}
+        speedup = timings['html.parser'] / min(timings.values())
+        print(f"{os.path.basename(path):<24}{len(html) // 1024:>8}KB  "
+              + ''.join(f"{timings[name] * 1000:>12.2f}ms" for name in parsers)
+              + f"{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
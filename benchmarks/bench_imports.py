@@ -0,0 +1,69 @@
+"""Benchmark of CLI start-up cost.
+
+Imports each entry module and each source SDK in a fresh interpreter and
+reports the median wall time, plus which SDKs importing the entry module
+pulled in. With lazy source loading the entry modules should not load any
+SDK until a source is actually searched.
+
+Usage:
+    python benchmarks/bench_imports.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from web_search import SOURCE_MODULES
+
+ENTRY_MODULES = ['main', 'web_search', 'summarizer', 'gemini_api']
+SDK_MODULES = sorted(set(SOURCE_MODULES.values()) | {'google.generativeai'})
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {sdks!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module: str, repeat: int):
+    """Return the median import time of module and the SDKs it loaded."""
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, sdks=SDK_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+        loaded = probe['loaded']
+    return statistics.median(timings), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark module import times')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module')
+    args = parser.parse_args()
+
+    print(f"{'module':<24}{'import':>10}  SDKs loaded")
+    for module in ENTRY_MODULES:
+        seconds, loaded = time_import(module, args.repeat)
+        print(f"{module:<24}{seconds * 1000:>8.0f}ms  {', '.join(loaded) or '-'}")
+
+    print(f"\n{'SDK':<24}{'import':>10}")
+    for module in SDK_MODULES:
+        try:
+            seconds, _ = time_import(module, args.repeat)
+        except subprocess.CalledProcessError:
+            print(f"{module:<24}{'missing':>10}")
+            continue
+        print(f"{module:<24}{seconds * 1000:>8.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Offline end-to-end benchmark of the main.py pipeline.
+
+Every external service (Tavily, arXiv, Scholar, Wikipedia, PubMed, Gemini
+and the fetched web pages) is replaced by the local fakes in
+benchmarks/fakes.py, with configurable latency and failure distributions,
+so runs cost no quota and are not at the mercy of network noise.
+
+The report lists per-stage p50/p95 latency, total wall time and model
+calls per result, and is saved as JSON for comparison between versions.
+Every run is cold: main.py runs with --no-cache --no-index in a fresh
+working directory, so no run is served from an earlier one. With --warm
+the caches and the findings index are shared across runs instead, so
+only the first run is cold.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--runs N] [--warm] [--profile profile.json]
+        [--compare previous.json] [-- extra main.py arguments]
+
+A profile overrides the defaults in fakes.DEFAULT_PROFILE, for example
+{"scholar": {"median": 10, "failure_rate": 0.3}, "llm": {"median": 3}}.
+"""
+import argparse
+import contextlib
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fakes
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+class StageRecorder:
+    """Collects the duration of every call made in each pipeline stage."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, attribute: str, stage: str):
+        """Replace ``owner.attribute`` with a version that records its duration under ``stage``.
+
+        Generator functions are timed from the first item until they are exhausted or closed.
+        """
+        original = getattr(owner, attribute)
+
+        if inspect.isgeneratorfunction(original):
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        setattr(owner, attribute, timed)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize_stages(durations: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {
+            "count": len(values),
+            "p50": round(percentile(values, 0.50), 4),
+            "p95": round(percentile(values, 0.95), 4),
+            "total": round(sum(values), 4),
+        }
+        for stage, values in sorted(durations.items()) if values
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def with_fake_session(init, world):
+    """Wrap a constructor so the instance's requests.Session is replaced by a FakeSession."""
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.session = fakes.FakeSession(world)
+    return wrapper
+
+
+def run_benchmark(args, main_args: List[str]) -> Dict:
+    world = fakes.FakeWorld(profile=args.profile, seed=args.seed)
+    fakes.install(world)
+
+    # Imported after the fakes are installed so they bind to the stand-ins
+    import main as pipeline
+    from metrics import metrics
+    from gemini_api import GeminiAPI
+    from report import ReportWriter
+    from summarizer import Summarizer
+    from web_search import SOURCES, WebSearch
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    recorder = StageRecorder()
+    for source in SOURCES:
+        recorder.wrap(WebSearch, f"search_{source}", f"search.{source}")
+    recorder.wrap(WebSearch, 'search_all', 'search')
+    recorder.wrap(Summarizer, 'extract_content', 'extract')
+    recorder.wrap(GeminiAPI, '_generate', 'llm')
+    recorder.wrap(Summarizer, 'iter_search_results', 'summarize')
+    recorder.wrap(Summarizer, 'stream_search_results', 'summarize')
+    recorder.wrap(Summarizer, 'synthesize', 'synthesize')
+    recorder.wrap(ReportWriter, 'finish', 'report')
+
+    # Route page fetches and MediaWiki queries to the fake web
+    for cls in (Summarizer, WebSearch):
+        cls.__init__ = with_fake_session(cls.__init__, world)
+
+    run_times = []
+    counters: Dict[str, float] = {}
+    cwd = os.getcwd()
+    for run in range(args.runs):
+        argv = ['main.py', args.query, '--output', 'console'] + main_args
+        if not args.warm:
+            argv += ['--no-cache', '--no-index']
+        # A fresh working directory per run, so checkpoints never carry over
+        os.chdir(tempfile.mkdtemp(prefix='sagescope-bench-run-'))
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sys.argv = argv
+                pipeline.main()
+        finally:
+            os.chdir(cwd)
+        run_times.append(time.perf_counter() - start)
+        for name, value in metrics.counters.items():
+            counters[name] = counters.get(name, 0) + value
+        print(f"Run {run + 1}/{args.runs}: {run_times[-1]:.2f}s")
+
+    results = int(counters.get('summarize.results', 0))
+    calls = world.calls()
+    return {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "query": args.query,
+        "runs": args.runs,
+        "warm": args.warm,
+        "main_args": main_args,
+        "profile": world.profile,
+        "wall_time": {
+            "total": round(sum(run_times), 4),
+            "p50": round(percentile(run_times, 0.50), 4),
+            "p95": round(percentile(run_times, 0.95), 4),
+        },
+        "stages": summarize_stages(recorder.durations),
+        "service_calls": calls,
+        "counters": counters,
+        "results_processed": results,
+        "llm_calls_per_result": round(calls['llm'] / results, 3) if results else None,
+    }
+
+
+def print_report(report: Dict, baseline: Dict = None):
+    def delta(new, old):
+        if old in (None, 0) or new is None:
+            return ''
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    base_stages = (baseline or {}).get('stages', {})
+    print(f"\nWall time: {report['wall_time']['p50']:.2f}s p50, {report['wall_time']['p95']:.2f}s p95"
+          + delta(report['wall_time']['p50'], (baseline or {}).get('wall_time', {}).get('p50')))
+    print(f"\n{'stage':<20}{'calls':>7}{'p50 (s)':>16}{'p95 (s)':>16}")
+    for stage, stats in report['stages'].items():
+        old = base_stages.get(stage, {})
+        print(f"{stage:<20}{stats['count']:>7}"
+              f"{stats['p50']:>9.3f}{delta(stats['p50'], old.get('p50')):>7}"
+              f"{stats['p95']:>9.3f}{delta(stats['p95'], old.get('p95')):>7}")
+    print(f"\nResults processed: {report['results_processed']}")
+    print(f"Model calls per result: {report['llm_calls_per_result']}"
+          + delta(report['llm_calls_per_result'], (baseline or {}).get('llm_calls_per_result')))
+    print(f"Service calls: {report['service_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the SageScope pipeline')
+    parser.add_argument('--query', default='AI in agriculture', help='Research query to run')
+    parser.add_argument('--runs', type=int, default=3, help='Number of pipeline runs')
+    parser.add_argument('--warm', action='store_true',
+                        help='Share the caches and findings index across runs, so runs after the first are warm')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the latency and failure draws')
+    parser.add_argument('--profile', type=argparse.FileType('r'), help='JSON file overriding service latencies')
+    parser.add_argument('--output', help='Where to save the JSON results (default: benchmarks/results/)')
+    parser.add_argument('--compare', type=argparse.FileType('r'), help='Earlier results to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Keep INFO logging from the pipeline')
+    args, main_args = parser.parse_known_args()
+    if main_args and main_args[0] == '--':
+        main_args = main_args[1:]
+    args.profile = json.load(args.profile) if args.profile else None
+    if not args.warm and {'--from-index', '--refresh-cache'} & set(main_args):
+        parser.error('--from-index and --refresh-cache need the caches, pass --warm')
+
+    # Keep fake credentials, a private cache directory and effectively unlimited quotas unless overridden
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ.setdefault('TAVILY_API_KEY', 'benchmark')
+    os.environ.setdefault('GEMINI_RPM', '100000')
+    os.environ.setdefault('GEMINI_TPM', '1000000000')
+    os.environ.setdefault('SAGESCOPE_CACHE_DIR', tempfile.mkdtemp(prefix='sagescope-bench-'))
+
+    report = run_benchmark(args, main_args)
+    baseline = json.load(args.compare) if args.compare else None
+    print_report(report, baseline)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Offline benchmark of the research service and its request coalescing.
+
+Starts server.py on a free localhost port with every external service
+replaced by the fakes in benchmarks/fakes.py, then has concurrent clients
+submit a mix of identical ("hot") and distinct queries and follow each
+job's event stream to the end. Reports the latency seen by the clients,
+how many jobs actually ran, and the calls made to each fake service.
+
+Usage:
+    python benchmarks/bench_server.py [--clients N] [--hot-share F]
+        [--profile profile.json] [-- extra main.py arguments]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fakes
+from bench_pipeline import percentile, with_fake_session
+
+
+def post_json(url: str, payload: Dict) -> Dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def follow_job(base_url: str, query: str) -> Dict:
+    """Submit a query, read its event stream until the job ends and return what the client saw."""
+    start = time.perf_counter()
+    job = post_json(f"{base_url}/research", {'query': query})
+    first_result = None
+    results = 0
+    status = None
+    with urllib.request.urlopen(f"{base_url}/jobs/{job['job_id']}/stream") as stream:
+        for line in stream:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event['event'] == 'result':
+                results += 1
+                if first_result is None:
+                    first_result = time.perf_counter() - start
+            elif event['event'] == 'status':
+                status = event['status']
+    return {
+        'coalesced': job['coalesced'],
+        'status': status,
+        'results': results,
+        'first_result': first_result,
+        'latency': time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the research service with fake backends')
+    parser.add_argument('--clients', type=int, default=16, help='Requests sent at the same time')
+    parser.add_argument('--hot-share', type=float, default=0.75,
+                        help='Share of the requests asking the same query')
+    parser.add_argument('--max-jobs', type=int, default=4, help='Jobs the service runs at the same time')
+    parser.add_argument('--profile', help='JSON file overriding the fake latency profile')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='Keep INFO logging from the service')
+    args, main_args = parser.parse_known_args()
+    main_args = [arg for arg in main_args if arg != '--']
+    profile = None
+    if args.profile:
+        with open(args.profile) as f:
+            profile = json.load(f)
+
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ.setdefault('TAVILY_API_KEY', 'benchmark')
+    os.environ.setdefault('GEMINI_RPM', '100000')
+    os.environ.setdefault('GEMINI_TPM', '1000000000')
+    os.environ.setdefault('SAGESCOPE_CACHE_DIR', tempfile.mkdtemp(prefix='sagescope-bench-'))
+
+    world = fakes.FakeWorld(profile=profile, seed=args.seed)
+    fakes.install(world)
+
+    # Imported after the fakes are installed so they bind to the stand-ins
+    import server
+    from main import build_components, build_parser, parse_options
+    from metrics import metrics
+    from summarizer import Summarizer
+    from web_search import WebSearch
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    for cls in (Summarizer, WebSearch):
+        cls.__init__ = with_fake_session(cls.__init__, world)
+
+    # Caches and the findings index are off so every job that runs does the full work
+    options, source_timeouts = parse_options(build_parser(), ['--no-cache', '--no-index'] + main_args)
+    metrics.reset()
+    components = build_components(options, source_timeouts)
+    service = server.ResearchService(options, *components, max_jobs=args.max_jobs)
+    service.warm_up()
+    httpd = server.create_server(service, '127.0.0.1', 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{httpd.server_port}"
+
+    hot = round(args.clients * args.hot_share)
+    queries = ['quantum error correction'] * hot + [f"distinct topic {n}" for n in range(args.clients - hot)]
+    print(f"{args.clients} concurrent requests: {hot} identical, {args.clients - hot} distinct "
+          f"({args.max_jobs} jobs at a time)")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        outcomes: List[Dict] = list(executor.map(lambda query: follow_job(base_url, query), queries))
+    elapsed = time.perf_counter() - start
+    httpd.shutdown()
+    service.jobs.shutdown()
+
+    latencies = [outcome['latency'] for outcome in outcomes]
+    first_results = [outcome['first_result'] for outcome in outcomes if outcome['first_result'] is not None]
+    statuses: Dict[str, int] = {}
+    for outcome in outcomes:
+        statuses[outcome['status']] = statuses.get(outcome['status'], 0) + 1
+    print(f"\nWall time: {elapsed:.2f}s")
+    print(f"Client latency: {percentile(latencies, 0.5):.2f}s p50, {percentile(latencies, 0.95):.2f}s p95")
+    if first_results:
+        print(f"First result: {percentile(first_results, 0.5):.2f}s p50, {percentile(first_results, 0.95):.2f}s p95")
+    print("Job status: " + ', '.join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    print(f"Jobs run: {metrics.counters.get('service.jobs', 0):g}, "
+          f"coalesced requests: {metrics.counters.get('service.coalesced', 0):g}")
+    print("Service calls: " + ', '.join(f"{name} {count}" for name, count in sorted(world.calls().items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""Local stand-ins for every external service SageScope talks to.
+
+``install(profile)`` registers fake ``tavily``, ``arxiv``, ``scholarly``,
+``pymed`` and ``google.generativeai`` modules in ``sys.modules``; it must
+run before the SageScope modules are imported. ``FakeSession`` replaces the
+``requests.Session`` used by the Summarizer to fetch pages and by WebSearch
+to query the MediaWiki API. Every fake call sleeps for a latency drawn from a
+log-normal distribution and fails with a configurable probability.
+"""
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import types
+from typing import Dict, Optional
+
+# Per-service latency (median seconds, log-normal sigma) and failure rate
+DEFAULT_PROFILE = {
+    "tavily": {"median": 0.8, "sigma": 0.4, "failure_rate": 0.0},
+    "arxiv": {"median": 1.0, "sigma": 0.4, "failure_rate": 0.0},
+    "scholar": {"median": 4.0, "sigma": 0.6, "failure_rate": 0.1},
+    "wikipedia": {"median": 0.3, "sigma": 0.3, "failure_rate": 0.0},
+    "pubmed": {"median": 0.8, "sigma": 0.4, "failure_rate": 0.0},
+    "page": {"median": 0.4, "sigma": 0.7, "failure_rate": 0.05},
+    "llm": {"median": 1.5, "sigma": 0.4, "failure_rate": 0.02},
+}
+
+WORDS = (
+    "model data climate learning crop yield sensor network protein cell study results "
+    "significant method analysis quantum energy policy market growth patients trial dataset "
+    "neural graph soil water farming irrigation satellite imaging genome drought forecast"
+).split()
+
+
+class FakeServiceError(Exception):
+    """Raised by a fake service to simulate a failed request."""
+
+
+class Service:
+    """Latency and failure model for one fake service."""
+
+    def __init__(self, name: str, median: float, sigma: float, failure_rate: float, rng: random.Random):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def call(self):
+        """Sleep for one simulated request and raise if it is drawn to fail."""
+        with self._lock:
+            self.calls += 1
+            latency = self.median * math.exp(self._rng.gauss(0, self.sigma)) if self.median > 0 else 0.0
+            failed = self._rng.random() < self.failure_rate
+        time.sleep(latency)
+        if failed:
+            raise FakeServiceError(f"{self.name}: simulated failure")
+
+
+class FakeWorld:
+    """Holds the services and deterministic fake content for a benchmark run."""
+
+    def __init__(self, profile: Optional[Dict[str, Dict[str, float]]] = None, seed: int = 0):
+        merged = {name: dict(settings) for name, settings in DEFAULT_PROFILE.items()}
+        for name, settings in (profile or {}).items():
+            merged.setdefault(name, {}).update(settings)
+        self.profile = merged
+        self.rng = random.Random(seed)
+        self.services = {name: Service(name, rng=self.rng, **settings) for name, settings in merged.items()}
+
+    def text(self, words: int, key: str) -> str:
+        """Deterministic pseudo-text for a key, so repeated runs see the same content."""
+        rng = random.Random(key)
+        sentences = []
+        while words > 0:
+            length = min(words, rng.randint(8, 20))
+            sentences.append(' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.')
+            words -= length
+        return ' '.join(sentences)
+
+    def titles(self, source: str, query: str, count: int):
+        return [f"{query.title()} {source} result {i}" for i in range(count)]
+
+    def calls(self) -> Dict[str, int]:
+        return {name: service.calls for name, service in self.services.items()}
+
+
+# --- search SDKs -------------------------------------------------------------
+
+def _tavily_module(world: FakeWorld) -> types.ModuleType:
+    module = types.ModuleType('tavily')
+
+    class TavilyClient:
+        def __init__(self, api_key=None):
+            self.api_key = api_key
+
+        def search(self, query, search_depth="basic", max_results=5):
+            world.services['tavily'].call()
+            return {"results": [
+                {"title": title, "url": f"https://news{i}.example.com/{i}",
+                 "content": world.text(25, title)}
+                for i, title in enumerate(world.titles('tavily', query, max_results))
+            ]}
+
+    module.TavilyClient = TavilyClient
+    return module
+
+
+def _arxiv_module(world: FakeWorld) -> types.ModuleType:
+    module = types.ModuleType('arxiv')
+
+    class SortCriterion:
+        Relevance = 'relevance'
+
+    class Search:
+        def __init__(self, query, max_results=5, sort_by=None):
+            self.query = query
+            self.max_results = max_results
+
+        def results(self):
+            world.services['arxiv'].call()
+            for i, title in enumerate(world.titles('arxiv', self.query, self.max_results)):
+                yield types.SimpleNamespace(
+                    title=title, entry_id=f"http://arxiv.org/abs/2401.{i:05d}v1", summary=world.text(180, title)
+                )
+
+    module.SortCriterion = SortCriterion
+    module.Search = Search
+    return module
+
+
+def _scholarly_module(world: FakeWorld) -> types.ModuleType:
+    module = types.ModuleType('scholarly')
+
+    def search_pubs(query):
+        world.services['scholar'].call()
+        for i, title in enumerate(world.titles('scholar', query, 20)):
+            yield types.SimpleNamespace(bib={
+                'title': title, 'url': f"https://scholar{i}.example.org/paper/{i}", 'abstract': world.text(60, title)
+            })
+
+    module.search_pubs = search_pubs
+    module.scholarly = module
+    return module
+
+
+def _pymed_module(world: FakeWorld) -> types.ModuleType:
+    module = types.ModuleType('pymed')
+
+    class PubMed:
+        def __init__(self, tool="pymed", email=None):
+            pass
+
+        def query(self, query, max_results=100):
+            world.services['pubmed'].call()
+            for i, title in enumerate(world.titles('pubmed', query, max_results)):
+                yield types.SimpleNamespace(pubmed_id=str(30000000 + i), title=title, abstract=world.text(200, title))
+
+    module.PubMed = PubMed
+    return module
+
+
+# --- Gemini --------------------------------------------------------------------
+
+_DOCUMENT_IDS = re.compile(r"\[DOCUMENT ([^\]]+)\]")
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _fake_completion(world: FakeWorld, prompt: str) -> str:
+    """Produce a plausible response in the format the prompt asks for."""
+    summary = '\n'.join(f"- {world.text(12, prompt[-200:] + str(i))}" for i in range(3))
+    key_points = [world.text(10, prompt[-100:] + str(i)) for i in range(5)]
+    doc_ids = _DOCUMENT_IDS.findall(prompt)
+    if doc_ids:
+        return json.dumps({
+            doc_id: {"summary": f"{summary}\n- Document {doc_id}", "key_points": key_points}
+            for doc_id in doc_ids
+        })
+    if '"topic"' in prompt:
+        return json.dumps({"topic": world.text(3, prompt[-50:]).rstrip('.'), "synthesis": summary,
+                           "connections": key_points[:3]})
+    if 'JSON object' in prompt:
+        return json.dumps({"summary": summary, "key_points": key_points})
+    return summary
+
+
+def _stream_chunks(text: str, words_per_chunk: int = 8):
+    """Split a completion into the chunks a streamed response would deliver."""
+    words = re.split(r'(?<=\s)', text)
+    for start in range(0, len(words), words_per_chunk):
+        yield FakeResponse(''.join(words[start:start + words_per_chunk]))
+
+
+def _genai_module(world: FakeWorld) -> types.ModuleType:
+    module = types.ModuleType('google.generativeai')
+
+    class GenerativeModel:
+        def __init__(self, model_name, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            world.services['llm'].call()
+            text = _fake_completion(world, prompt)
+            if stream:
+                return _stream_chunks(text)
+            return FakeResponse(text)
+
+    module.configure = lambda **kwargs: None
+    module.GenerativeModel = GenerativeModel
+    return module
+
+
+# --- web pages -----------------------------------------------------------------
+
+class FakePageResponse:
+    def __init__(self, url: str, body: bytes):
+        self.url = url
+        self.status_code = 200
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeJSONResponse:
+    def __init__(self, payload: Dict):
+        self.status_code = 200
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def _mediawiki_search(world: FakeWorld, params: Dict) -> FakeJSONResponse:
+    """Answer a MediaWiki generator=search query with titles, URLs and extracts."""
+    world.services['wikipedia'].call()
+    pages = []
+    for i, title in enumerate(world.titles('wikipedia', params['gsrsearch'], params['gsrlimit'])):
+        slug = title.replace(' ', '_')
+        pages.append({
+            "pageid": 1000 + i, "ns": 0, "title": title, "index": i + 1,
+            "fullurl": f"https://en.wikipedia.org/wiki/{slug}", "extract": world.text(120, title),
+        })
+    return FakeJSONResponse({"batchcomplete": True, "query": {"pages": pages}})
+
+
+class FakeSession:
+    """Stands in for the pooled requests.Session used by Summarizer and WebSearch."""
+
+    def __init__(self, world: FakeWorld, paragraphs: int = 30):
+        self.world = world
+        self.paragraphs = paragraphs
+        self.headers = {}
+
+    def get(self, url, params=None, timeout=None, stream=False, **kwargs):
+        if params and params.get('generator') == 'search':
+            return _mediawiki_search(self.world, params)
+        self.world.services['page'].call()
+        body = ''.join(
+            f"<p>{self.world.text(60, url + str(i))}</p>" for i in range(self.paragraphs)
+        )
+        html = f"<html><head><title>{url}</title></head><body><nav>menu</nav><h1>{url}</h1>{body}</body></html>"
+        return FakePageResponse(url, html.encode('utf-8'))
+
+    def mount(self, prefix, adapter):
+        pass
+
+
+def install(world: FakeWorld):
+    """Register the fake SDK modules in sys.modules."""
+    modules = {
+        'tavily': _tavily_module(world),
+        'arxiv': _arxiv_module(world),
+        'scholarly': _scholarly_module(world),
+        'pymed': _pymed_module(world),
+        'google.generativeai': _genai_module(world),
+    }
+    if 'google' not in sys.modules:
+        try:
+            import google
+        except ImportError:
+            google = types.ModuleType('google')
+            google.__path__ = []
+            sys.modules['google'] = google
+    for name, module in modules.items():
+        sys.modules[name] = module
+    sys.modules['google'].generativeai = modules['google.generativeai']
@@ -0,0 +1,79 @@
+"""Offline smoke run of main.py's batch mode.
+
+Runs ``main.py --batch`` over a few queries with every external service
+replaced by the fakes in benchmarks/fakes.py (with the findings index and
+caches enabled, as by default) and checks that every query produced
+results. Exits non-zero if any record failed, so it can guard batch mode
+in CI.
+
+Usage:
+    python benchmarks/smoke_batch.py [-- extra main.py arguments]
+"""
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fakes
+from bench_pipeline import with_fake_session
+
+QUERIES = ["quantum error correction", "soil microbiome", "graph neural networks"]
+
+# Fast, reliable fakes: this checks behaviour, not latency
+PROFILE = {name: {"median": 0.01, "sigma": 0.1, "failure_rate": 0.0} for name in fakes.DEFAULT_PROFILE}
+
+
+def main() -> int:
+    workdir = tempfile.mkdtemp(prefix='sagescope-smoke-')
+    os.environ.setdefault('GEMINI_API_KEY', 'smoke')
+    os.environ.setdefault('TAVILY_API_KEY', 'smoke')
+    os.environ.setdefault('GEMINI_RPM', '100000')
+    os.environ.setdefault('GEMINI_TPM', '1000000000')
+    os.environ['SAGESCOPE_CACHE_DIR'] = os.path.join(workdir, 'cache')
+
+    world = fakes.FakeWorld(profile=PROFILE)
+    fakes.install(world)
+
+    # Imported after the fakes are installed so they bind to the stand-ins
+    import main as pipeline
+    from summarizer import Summarizer
+    from web_search import WebSearch
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for cls in (Summarizer, WebSearch):
+        cls.__init__ = with_fake_session(cls.__init__, world)
+
+    queries_path = os.path.join(workdir, 'queries.txt')
+    jsonl_path = os.path.join(workdir, 'batch.jsonl')
+    with open(queries_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(QUERIES) + '\n')
+
+    extra = [arg for arg in sys.argv[1:] if arg != '--']
+    sys.argv = ['main.py', '--batch', queries_path, '--jsonl', jsonl_path, '--host-delay', '0'] + extra
+    # Checkpoints are written relative to the working directory
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline.main()
+
+    with open(jsonl_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    failures = [record for record in records if record['status'] != 'ok' or not record['results_processed']]
+    for record in sorted(records, key=lambda record: record['index']):
+        print(f"{record['index']}: {record['status']:<10} {record['results_processed']:>3} results  "
+              f"{record['query']}" + (f"  ({record['error']})" if record.get('error') else ''))
+    if len(records) != len(QUERIES) or failures:
+        print(f"FAILED: {len(failures)} of {len(QUERIES)} queries did not produce results")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = 'checkpoints'
+
+
+def checkpoint_path(query: str, directory: str = CHECKPOINT_DIR) -> str:
+    """Return the checkpoint file for a query; the same query always maps to the same file."""
+    normalized = ' '.join(query.lower().split())
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:10]
+    slug = re.sub(r'[^\w\-]+', '_', normalized).strip('_')[:60]
+    return os.path.join(directory, f"{slug}_{digest}.jsonl")
+
+
+class CheckpointStore:
+    """Durable per-run store of processed results, keyed by URL.
+
+    Each record is appended to a JSONL file and fsynced as soon as it is
+    added, so an interrupted run loses at most the result in flight. When
+    not resuming, any previous checkpoint for the same path is discarded.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+            logger.info(f"Resuming from {path} with {len(self._records)} completed results")
+        else:
+            open(path, 'w', encoding='utf-8').close()
+
+    def _load(self):
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                # A crash mid-write leaves a truncated last line; cut it off so
+                # records added after resuming start on a line of their own
+                logger.warning(f"Dropping truncated last line of {self.path}")
+                f.truncate(complete)
+        for line in data[:complete].decode('utf-8', errors='replace').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping unreadable checkpoint line in {self.path}")
+                continue
+            self._records[record['url']] = record
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._records
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def get(self, url: str):
+        with self._lock:
+            return self._records.get(url)
+
+    def add(self, record: Dict):
+        """Persist a processed result immediately."""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._records[record['url']] = record
+
+    def records(self) -> List[Dict]:
+        """All completed results in the order they were first completed."""
+        with self._lock:
+            return list(self._records.values())
@@ -0,0 +1,116 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from scipy import sparse
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+from ranking import TITLE_WEIGHT, tokenize
+
+# Clusters are merged while the average cosine similarity between their members is at least this
+DEFAULT_SIMILARITY_THRESHOLD = 0.2
+
+# Research domain of each search source, used to tell cross-domain clusters apart
+SOURCE_DOMAINS = {
+    "tavily": "web",
+    "arxiv": "academic",
+    "scholar": "academic",
+    "pubmed": "academic",
+    "wikipedia": "encyclopedia",
+}
+
+
+def tfidf_matrix(documents: List[str]) -> Tuple[sparse.csr_matrix, List[str]]:
+    """Build an L2-normalized sparse TF-IDF matrix (documents x vocabulary).
+
+    Term frequencies are sublinear (1 + log tf) and IDF is smoothed, so the
+    dot product of two rows is their cosine similarity. Returns the matrix
+    and the term of each column.
+    """
+    vocabulary: Dict[str, int] = {}
+    rows, columns, counts = [], [], []
+    for row, document in enumerate(documents):
+        frequencies: Dict[int, int] = {}
+        for token in tokenize(document):
+            column = vocabulary.setdefault(token, len(vocabulary))
+            frequencies[column] = frequencies.get(column, 0) + 1
+        rows.extend([row] * len(frequencies))
+        columns.extend(frequencies)
+        counts.extend(frequencies.values())
+
+    tf = sparse.csr_matrix(
+        (1 + np.log(np.asarray(counts, dtype=np.float64)), (rows, columns)),
+        shape=(len(documents), len(vocabulary)),
+    )
+    document_frequencies = np.bincount(columns, minlength=len(vocabulary))
+    idf = np.log((1 + len(documents)) / (1 + document_frequencies)) + 1
+    weighted = tf @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    normalized = sparse.diags(1 / np.maximum(norms, 1e-12)) @ weighted
+    return normalized.tocsr(), sorted(vocabulary, key=vocabulary.get)
+
+
+def cluster_documents(documents: List[str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD) -> List[List[int]]:
+    """Group similar documents by their TF-IDF vectors, largest group first."""
+    if not documents:
+        return []
+    return _similarity_clusters(tfidf_matrix(documents)[0], threshold)
+
+
+def _similarity_clusters(matrix: sparse.csr_matrix, threshold: float) -> List[List[int]]:
+    """Average-linkage clustering of the rows of a normalized TF-IDF matrix.
+
+    All pairwise cosine similarities come from one sparse matrix product.
+    Average linkage keeps loosely related topics apart where linking every
+    pair above the threshold would chain them into one cluster.
+    """
+    count = matrix.shape[0]
+    if count == 1:
+        return [[0]]
+    similarity = (matrix @ matrix.T).toarray()
+    distances = np.clip(1 - similarity, 0, None)
+    np.fill_diagonal(distances, 0)
+    tree = linkage(squareform(distances, checks=False), method='average')
+    labels = fcluster(tree, t=1 - threshold, criterion='distance')
+
+    clusters: Dict[int, List[int]] = {}
+    for index, label in enumerate(labels):
+        clusters.setdefault(label, []).append(index)
+    return sorted(clusters.values(), key=lambda members: (-len(members), members[0]))
+
+
+def top_terms(matrix: sparse.csr_matrix, terms: List[str], members: List[int], count: int = 5) -> List[str]:
+    """Return the highest weighted terms of the centroid of the given rows."""
+    centroid = np.asarray(matrix[members].mean(axis=0)).ravel()
+    order = np.argsort(-centroid, kind='stable')[:count]
+    return [terms[column] for column in order if centroid[column] > 0]
+
+
+def cluster_results(records: List[Dict], threshold: float = DEFAULT_SIMILARITY_THRESHOLD) -> List[Dict]:
+    """Cluster processed results by the TF-IDF similarity of their title, summary and key points.
+
+    Returns one dict per cluster with the indices of its ``members``, its
+    most characteristic ``terms``, the research ``domains`` it spans and
+    whether it is ``cross_domain``.
+    """
+    documents = [
+        ' '.join([record.get('title') or ''] * TITLE_WEIGHT
+                 + [record.get('summary') or ''] + list(record.get('key_points') or []))
+        for record in records
+    ]
+    if not documents:
+        return []
+    matrix, terms = tfidf_matrix(documents)
+    clusters = []
+    for members in _similarity_clusters(matrix, threshold):
+        domains = sorted({
+            SOURCE_DOMAINS.get(source, source)
+            for index in members
+            for source in records[index].get('sources', [records[index]['source']])
+        })
+        clusters.append({
+            'members': members,
+            'terms': top_terms(matrix, terms, members),
+            'domains': domains,
+            'cross_domain': len(domains) > 1,
+        })
+    return clusters
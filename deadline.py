@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Share of the deadline that must still be left for each step. Outstanding
+# searches are cancelled once less is left than SEARCH_MIN_LEFT, pages are
+# no longer fetched below EXTRACT_MIN_LEFT, prompts are shortened below
+# FULL_PROMPT_MIN_LEFT, the model is not called at all below MODEL_MIN_LEFT
+# and FINISH_MIN_LEFT is kept back for assembling the report.
+SEARCH_MIN_LEFT = 0.6
+EXTRACT_MIN_LEFT = 0.4
+FULL_PROMPT_MIN_LEFT = 0.3
+SYNTHESIS_MIN_LEFT = 0.15
+MODEL_MIN_LEFT = 0.1
+FINISH_MIN_LEFT = 0.05
+
+# Content tokens sent to the model once prompts are shortened
+SHORT_PROMPT_TOKENS = 800
+
+# How a result is processed, from the most to the least thorough
+FULL = "full"
+SHORT = "short"
+SNIPPET = "snippet"
+
+
+class Deadline:
+    """Time budget of one research run, and the scheduler deciding what still fits in it.
+
+    Each stage asks the deadline before it starts work and degrades as time
+    runs out: outstanding searches are cancelled, page extraction gives way
+    to search snippets, prompts get shorter and finally results are shown
+    as snippets without a model summary. Every step that is skipped or cut
+    short is recorded so the report can list it.
+    """
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("The deadline must be positive")
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + seconds
+        self._lock = threading.Lock()
+        # Skipped steps in the order they happened, with the number of results affected (None for whole steps)
+        self._skipped: Dict[str, Optional[int]] = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def share_left(self) -> float:
+        return self.remaining() / self.seconds
+
+    def allows(self, min_left: float) -> bool:
+        """Whether more than the min_left share of the deadline is still left."""
+        return self.share_left() > min_left
+
+    def time_until(self, min_left: float) -> float:
+        """Seconds until only the min_left share of the deadline is left (0 if already past)."""
+        return max(0.0, self.remaining() - min_left * self.seconds)
+
+    def mode(self) -> str:
+        """How thoroughly a result can still be processed: FULL, SHORT or SNIPPET."""
+        share = self.share_left()
+        if share > FULL_PROMPT_MIN_LEFT:
+            return FULL
+        if share > MODEL_MIN_LEFT:
+            return SHORT
+        return SNIPPET
+
+    def skip(self, step: str):
+        """Record a whole step that was skipped or cancelled to meet the deadline."""
+        with self._lock:
+            if step in self._skipped:
+                return
+            self._skipped[step] = None
+        metrics.increment("deadline.skipped")
+        logger.info(f"Deadline: {step} ({self.remaining():.1f}s left)")
+
+    def degrade(self, step: str, count: int = 1):
+        """Record that a step was skipped or cut short count more times, e.g. once per result."""
+        with self._lock:
+            self._skipped[step] = (self._skipped.get(step) or 0) + count
+        metrics.increment("deadline.degraded", count)
+
+    def notes(self) -> List[str]:
+        """Describe every step that was skipped or cut short, in the order it first happened."""
+        with self._lock:
+            return [step if count is None else f"{step}: {count}" for step, count in self._skipped.items()]
@@ -0,0 +1,171 @@
+import hashlib
+import re
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {'fbclid', 'gclid', 'ref', 'source'}
+
+DOI_PATTERN = re.compile(r'\b(10\.\d{4,9}/[^\s"<>?#]+)', re.IGNORECASE)
+ARXIV_ID_PATTERN = re.compile(r'arxiv\.org/(?:abs|pdf)/([^/?#]+?)(?:v\d+)?(?:\.pdf)?$', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+SIMHASH_BITS = 64
+# Snippets shorter than this are too short for a meaningful fingerprint
+MIN_FINGERPRINT_WORDS = 10
+# Records whose fingerprints differ in at most this many bits are near-duplicates.
+# Fingerprints are split into SIMHASH_BANDS bands; by the pigeonhole principle two
+# fingerprints within the distance share at least one band exactly.
+SIMHASH_MAX_DISTANCE = 5
+SIMHASH_BANDS = SIMHASH_MAX_DISTANCE + 1
+
+
+def normalize_url(url: str) -> str:
+    """Canonicalize a URL so trivially different links to the same page compare equal."""
+    if not url:
+        return ''
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+    normalized = f"{host}{path}" + (f"?{query}" if query else '')
+
+    # Abstract, PDF and versioned arXiv links all point to the same paper
+    arxiv_match = ARXIV_ID_PATTERN.search(normalized)
+    if arxiv_match:
+        return f"arxiv.org/abs/{arxiv_match.group(1).lower()}"
+    return normalized
+
+
+def extract_doi(*texts: Optional[str]) -> Optional[str]:
+    """Return the first DOI found in the given texts, lower-cased."""
+    for text in texts:
+        if not text:
+            continue
+        match = DOI_PATTERN.search(text)
+        if match:
+            return match.group(1).rstrip('.,;)]').lower()
+    return None
+
+
+def normalize_title(title: str) -> str:
+    return ' '.join(WORD_PATTERN.findall((title or '').lower()))
+
+
+def simhash(text: str, shingle_size: int = 1) -> int:
+    """64-bit SimHash fingerprint of the word shingles in text.
+
+    Single words work best for snippet-length text, where a one-word edit
+    would otherwise change several longer shingles at once.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)] if words else []
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def _bands(fingerprint: int) -> List[int]:
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [fingerprint >> (band * width) & mask for band in range(SIMHASH_BANDS)]
+
+
+def _richness(result: Dict) -> int:
+    return len(result.get('snippet') or '') + len(result.get('title') or '')
+
+
+def deduplicate(results: List[Dict]) -> List[Dict]:
+    """Collapse exact and near-duplicate search results across sources.
+
+    Results are grouped when they share a normalized URL, a DOI or a
+    normalized title, or when the SimHash fingerprints of their snippets
+    are within SIMHASH_MAX_DISTANCE bits. Candidate pairs come from
+    hash buckets, so the work stays roughly linear in the number of results.
+
+    Each group keeps its richest record (longest snippet), annotated with
+    ``sources`` and ``urls`` listing every source and link it was found
+    under. Groups are returned in order of first appearance.
+    """
+    parent = list(range(len(results)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    exact_keys: Dict[str, int] = {}
+    band_buckets: Dict[tuple, List[int]] = {}
+    fingerprints = []
+
+    for index, result in enumerate(results):
+        keys = []
+        url = normalize_url(result.get('url', ''))
+        if url:
+            keys.append(f"url:{url}")
+        doi = extract_doi(result.get('url'), result.get('snippet'))
+        if doi:
+            keys.append(f"doi:{doi}")
+        title = normalize_title(result.get('title', ''))
+        if len(title.split()) >= 4:
+            keys.append(f"title:{title}")
+        for key in keys:
+            if key in exact_keys:
+                union(index, exact_keys[key])
+            else:
+                exact_keys[key] = index
+
+        snippet = result.get('snippet') or ''
+        if len(WORD_PATTERN.findall(snippet.lower())) < MIN_FINGERPRINT_WORDS:
+            fingerprints.append(None)
+            continue
+        fingerprint = simhash(snippet)
+        fingerprints.append(fingerprint)
+        for band, value in enumerate(_bands(fingerprint)):
+            bucket = band_buckets.setdefault((band, value), [])
+            for other in bucket:
+                if bin(fingerprint ^ fingerprints[other]).count('1') <= SIMHASH_MAX_DISTANCE:
+                    union(index, other)
+            bucket.append(index)
+
+    groups: Dict[int, List[int]] = {}
+    for index in range(len(results)):
+        groups.setdefault(find(index), []).append(index)
+
+    deduplicated = []
+    for members in groups.values():
+        best = max(members, key=lambda i: (_richness(results[i]), -i))
+        record = dict(results[best])
+        record['sources'] = list(dict.fromkeys(results[i]['source'] for i in members))
+        record['urls'] = list(dict.fromkeys(results[i]['url'] for i in members if results[i].get('url')))
+        deduplicated.append(record)
+
+    if len(deduplicated) < len(results):
+        logger.info(f"Collapsed {len(results) - len(deduplicated)} duplicate results")
+    return deduplicated
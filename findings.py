@@ -0,0 +1,125 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+from cache import CACHE_DIR
+from ranking import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FINDINGS_PATH = os.path.join(CACHE_DIR, "findings.sqlite")
+
+# Findings older than this are re-summarized instead of reused
+DEFAULT_MAX_AGE_DAYS = 30
+
+# Prior findings that are enough to answer a query without live sources
+DEFAULT_MIN_RESULTS = 5
+
+# Share of a query's terms a finding must contain to match it; BM25 alone
+# ranks a finding sharing a single common word with the query
+DEFAULT_MIN_COVERAGE = 0.75
+
+# BM25 weights of the indexed columns: title, summary, key points
+COLUMN_WEIGHTS = (4.0, 1.0, 2.0)
+
+
+class FindingsIndex:
+    """Full-text index of every processed result, backed by SQLite FTS5.
+
+    Records are keyed by URL; indexing a URL again replaces its record.
+    Titles, summaries and key points are searchable and ranked with BM25,
+    so a repeat or related query can be answered from earlier runs without
+    searching or summarizing again. A single connection is shared between
+    threads behind a lock.
+    """
+
+    def __init__(self, path: str = DEFAULT_FINDINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS findings (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    key_points TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    query TEXT,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS findings_fts USING fts5(
+                    title, summary, key_points,
+                    content='findings', content_rowid='id', tokenize='porter unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS findings_ai AFTER INSERT ON findings BEGIN
+                    INSERT INTO findings_fts (rowid, title, summary, key_points)
+                    VALUES (new.id, new.title, new.summary, new.key_points);
+                END;
+                CREATE TRIGGER IF NOT EXISTS findings_ad AFTER DELETE ON findings BEGIN
+                    INSERT INTO findings_fts (findings_fts, rowid, title, summary, key_points)
+                    VALUES ('delete', old.id, old.title, old.summary, old.key_points);
+                END;
+            """)
+
+    def add(self, record: Dict, query: Optional[str] = None):
+        """Index a processed result, replacing any earlier record for its URL."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM findings WHERE url = ?", (record['url'],))
+            self._conn.execute(
+                "INSERT INTO findings (url, title, summary, key_points, record, query, indexed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record['url'], record['title'], record['summary'], '\n'.join(record['key_points']),
+                 json.dumps(record, ensure_ascii=False), query, time.time()),
+            )
+
+    def get(self, url: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """Return the record indexed for url, or None if it is missing or older than max_age seconds."""
+        with self._lock:
+            row = self._conn.execute("SELECT record, indexed_at FROM findings WHERE url = ?", (url,)).fetchone()
+        if row is None or (max_age is not None and row[1] < time.time() - max_age):
+            return None
+        return json.loads(row[0])
+
+    def search(self, query: str, limit: int = 10, max_age: Optional[float] = None,
+               min_coverage: float = DEFAULT_MIN_COVERAGE) -> List[Dict]:
+        """Return the records best matching query, most relevant first.
+
+        Only records containing at least the ``min_coverage`` share of the
+        query's terms match, so a partial match such as a single shared
+        word doesn't count as an answer. Each record carries its ``score``
+        (higher is better) and ``indexed_at`` time. Records older than
+        ``max_age`` seconds are left out.
+        """
+        # Quoted terms keep FTS5 query syntax in user input from being interpreted
+        terms = [f'"{term}"' for term in dict.fromkeys(tokenize(query))]
+        if not terms:
+            return []
+        required = max(1, math.ceil(min_coverage * len(terms)))
+        # Each term's matches are looked up once; the sum is the number of terms a record contains
+        matched = ' + '.join(["(f.id IN (SELECT rowid FROM findings_fts WHERE findings_fts MATCH ?))"] * len(terms))
+        oldest = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT f.record, f.indexed_at, bm25(findings_fts, ?, ?, ?) AS rank"
+                " FROM findings_fts JOIN findings f ON f.id = findings_fts.rowid"
+                f" WHERE findings_fts MATCH ? AND f.indexed_at >= ? AND ({matched}) >= ?"
+                " ORDER BY rank LIMIT ?",
+                (*COLUMN_WEIGHTS, ' OR '.join(terms), oldest, *terms, required, limit),
+            ).fetchall()
+        # FTS5's bm25() is lower for better matches
+        return [dict(json.loads(record), score=round(-rank, 4), indexed_at=indexed_at)
+                for record, indexed_at, rank in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM findings").fetchone()[0]
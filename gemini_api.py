@@ -1,16 +1,231 @@
 import os
-import google.generativeai as genai
-from typing import List, Dict, Optional
+import importlib
+from typing import Any, Iterator, List, Dict, Optional
 import time
+import hashlib
+import json
+import random
+import re
+import threading
 from dotenv import load_dotenv
 import logging
+from cache import SQLiteCache, CACHE_DIR
+from rate_limit import ModelRateLimiter
+from metrics import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = 'gemini-pro'
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+
+# Tokens budgeted for the response when estimating the size of a request
+OUTPUT_TOKEN_ESTIMATE = 512
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> ModelRateLimiter:
+    """Return the limiter shared by every GeminiAPI instance in the process.
+    
+    Quotas come from GEMINI_RPM, GEMINI_TPM and GEMINI_MAX_CONCURRENCY.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = ModelRateLimiter(
+                requests_per_minute=float(os.getenv("GEMINI_RPM", "60")),
+                tokens_per_minute=float(os.getenv("GEMINI_TPM", "120000")),
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+            )
+        return _rate_limiter
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an API error means we exceeded a quota (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    return (
+        getattr(error, 'code', None) == 429
+        or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+        or '429' in str(error)
+    )
+
+SUMMARY_PROMPT = """You are a helpful research assistant. Given the following content, 
+        generate a concise bullet-point summary. Highlight important stats, findings, and ideas. 
+        Format clearly with markdown bullet points.
+        
+        Content:
+        {content}
+        """
+
+KEY_POINTS_PROMPT = """Extract the 5 most important key points from the following content.
+        Format each point as a separate bullet point.
+        
+        Content:
+        {content}
+        """
+
+DOMAIN_PROMPT = """Analyze the following content from a {domain} perspective.
+        Provide:
+        1. Main findings
+        2. Methodology (if applicable)
+        3. Key implications
+        4. Limitations (if any)
+        
+        Content:
+        {content}
+        """
+
+ANALYSIS_PROMPT = """You are a helpful research assistant. Analyze the following content and
+        respond with a single JSON object and nothing else, using this schema:
+        {{"summary": "<concise markdown bullet-point summary highlighting important stats, findings and ideas>",
+          "key_points": ["<key point>", "... up to 5 of the most important key points"]}}
+        
+        Content:
+        {content}
+        """
+
+BATCH_ANALYSIS_PROMPT = """You are a helpful research assistant. Below are several documents, each
+        introduced by a line of the form [DOCUMENT <id>]. Analyze every document on its own and
+        respond with a single JSON object and nothing else, mapping each document id to an object
+        with this schema:
+        {{"summary": "<concise markdown bullet-point summary highlighting important stats, findings and ideas>",
+          "key_points": ["<key point>", "... up to 5 of the most important key points"]}}
+        Include every id exactly once and never combine documents.
+        
+        Documents:
+        {documents}
+        """
+
+REDUCE_PROMPT = """You are a helpful research assistant. The following are summaries of consecutive
+        sections of one long document. Combine them into an analysis of the whole document and
+        respond with a single JSON object and nothing else, using this schema:
+        {{"summary": "<concise markdown bullet-point summary highlighting important stats, findings and ideas>",
+          "key_points": ["<key point>", "... up to 5 of the most important key points"]}}
+        
+        Section summaries:
+        {content}
+        """
+
+SYNTHESIS_PROMPT = """You are a helpful research assistant. The following are summaries of related
+        sources from different research domains, each introduced by a line of the form
+        [SOURCE <n> | <domain>]. Synthesize what they say together and respond with a single JSON
+        object and nothing else, using this schema:
+        {{"topic": "<short name for the shared topic>",
+          "synthesis": "<concise markdown bullet-point synthesis of the combined findings, noting agreements and disagreements>",
+          "connections": ["<insight linking findings across domains, citing sources as [n]>", "... up to 5"]}}
+        
+        Sources:
+        {documents}
+        """
+
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of model tokens in text (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def _decode_json_object(text: str) -> Any:
+    """Decode the JSON object in a model response, ignoring code fences and surrounding text."""
+    text = _JSON_FENCE.sub('', text.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            return None
+        try:
+            return json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+
+def parse_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a structured analysis response into summary and key points.
+    
+    Tolerates markdown code fences and text around the JSON object. Returns
+    None when no usable object can be recovered.
+    """
+    return normalize_analysis(_decode_json_object(text))
+
+def _string_list(value: Any) -> List[str]:
+    """Coerce a list or newline-separated string from a model response into stripped strings.
+
+    Anything else (a number, an object) counts as no items.
+    """
+    if isinstance(value, str):
+        value = value.split('\n')
+    elif not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
+
+def normalize_analysis(data: Any) -> Optional[Dict[str, Any]]:
+    """Coerce a decoded analysis object into ``{"summary": str, "key_points": [str]}``."""
+    if not isinstance(data, dict) or 'summary' not in data:
+        return None
+    
+    summary = data['summary']
+    if isinstance(summary, list):
+        summary = '\n'.join(f"- {str(item).strip()}" for item in summary)
+    if not str(summary).strip():
+        return None
+    return {"summary": str(summary).strip(), "key_points": _string_list(data.get('key_points'))}
+
+def parse_batch_analysis(text: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Parse a batched analysis response into per-document analyses keyed by id.
+    
+    Documents that are missing, malformed or share a summary with another
+    document (a sign the model merged them) are left out so callers can
+    retry them individually.
+    """
+    data = _decode_json_object(text)
+    if not isinstance(data, dict):
+        return {}
+    
+    analyses = {}
+    for doc_id in doc_ids:
+        analysis = normalize_analysis(data.get(doc_id))
+        if analysis is not None:
+            analyses[doc_id] = analysis
+    
+    summaries = [analysis['summary'] for analysis in analyses.values()]
+    return {
+        doc_id: analysis for doc_id, analysis in analyses.items()
+        if summaries.count(analysis['summary']) == 1
+    }
+
+def parse_synthesis(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a cluster synthesis response into topic, synthesis and connections.
+    
+    Returns None when no usable object can be recovered.
+    """
+    data = _decode_json_object(text)
+    if not isinstance(data, dict) or not str(data.get('synthesis') or '').strip():
+        return None
+    
+    synthesis = data['synthesis']
+    if isinstance(synthesis, list):
+        synthesis = '\n'.join(f"- {str(item).strip()}" for item in synthesis)
+    return {
+        "topic": str(data.get('topic') or '').strip(),
+        "synthesis": str(synthesis).strip(),
+        "connections": _string_list(data.get('connections')),
+    }
+
+def response_cache_key(model_name: str, template: str, fields: Dict[str, str]) -> str:
+    """Hash the model name, prompt template and prompt fields into a cache key.
+    
+    The template itself is part of the key, so editing a prompt invalidates
+    every response generated with the old wording.
+    """
+    digest = hashlib.sha256()
+    for part in (model_name, template, json.dumps(fields, sort_keys=True)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
 class GeminiAPI:
-    def __init__(self):
+    def __init__(self, cache: Optional[SQLiteCache] = None, use_cache: bool = True,
+                 rate_limiter: Optional[ModelRateLimiter] = None, max_retries: int = 3):
         # Load environment variables
         load_dotenv(override=True)
         
@@ -48,67 +263,274 @@ class GeminiAPI:
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-        try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-            logger.info("Successfully initialized Gemini API")
-        except Exception as e:
-            logger.error(f"Failed to initialize Gemini API: {str(e)}")
-            raise
+        # The Gemini SDK is slow to import, so the model is created on first
+        # use; runs answered entirely from the cache never load it.
+        self.api_key = api_key
+        self.model_name = MODEL_NAME
+        self._model = None
+        self._model_lock = threading.Lock()
         
-    def generate_summary(self, content: str, max_retries: int = 3) -> str:
-        """Generate a summary using Gemini Pro with retry logic."""
-        prompt = """You are a helpful research assistant. Given the following content, 
-        generate a concise bullet-point summary. Highlight important stats, findings, and ideas. 
-        Format clearly with markdown bullet points.
+        # Content-addressed response cache shared across queries and runs
+        if cache is None and use_cache:
+            cache = SQLiteCache(DEFAULT_LLM_CACHE_PATH, max_entries=5000)
+        self.cache = cache if use_cache else None
         
-        Content:
-        {content}
+        # All model calls in the process share one RPM/TPM and concurrency budget
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.max_retries = max_retries
+
+    @property
+    def model(self):
+        """Gemini model client, created on first use."""
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    genai = importlib.import_module("google.generativeai")
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                    logger.info("Successfully initialized Gemini API")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Gemini API: {str(e)}")
+                    raise
+            return self._model
+
+    @model.setter
+    def model(self, model) -> None:
+        self._model = model
+
+    @metrics.timed("llm")
+    def _generate(self, template: str, max_retries: Optional[int] = None, **fields: str) -> str:
+        """Render a prompt template and return the model's text.
+        
+        Responses are served from the cache when possible. Model calls go
+        through the shared rate limiter and are retried with jittered
+        exponential backoff.
+        """
+        key = None
+        if self.cache is not None:
+            key = response_cache_key(self.model_name, template, fields)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.increment("llm.cache_hits")
+                metrics.annotate(cached=True)
+                return cached
+            metrics.increment("llm.cache_misses")
+        
+        prompt = template.format(**fields)
+        tokens = estimate_tokens(prompt)
+        logger.debug(f"Sending prompt of {len(prompt)} chars (~{tokens} tokens)")
+        metrics.increment("llm.calls")
+        metrics.increment("llm.prompt_tokens", tokens)
+        metrics.annotate(cached=False, prompt_chars=len(prompt), prompt_tokens=tokens)
+        
+        max_retries = max_retries or self.max_retries
+        for attempt in range(max_retries):
+            try:
+                with self.rate_limiter.request(tokens + OUTPUT_TOKEN_ESTIMATE):
+                    response = self.model.generate_content(prompt)
+                text = response.text
+                break
+            except Exception as e:
+                self._on_failure(e, attempt, max_retries)
+        
+        if key is not None:
+            self.cache.set(key, text)
+        return text
+
+    def _stream(self, template: str, max_retries: Optional[int] = None, **fields: str) -> Iterator[str]:
+        """Render a prompt template and yield the model's text as it is generated.
+        
+        A cached response is yielded in one piece. A failed request is only
+        retried if none of its text has been yielded yet; the complete text
+        is cached once the stream finishes.
         """
+        key = None
+        if self.cache is not None:
+            key = response_cache_key(self.model_name, template, fields)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.increment("llm.cache_hits")
+                yield cached
+                return
+            metrics.increment("llm.cache_misses")
         
+        prompt = template.format(**fields)
+        tokens = estimate_tokens(prompt)
+        metrics.increment("llm.calls")
+        metrics.increment("llm.streams")
+        metrics.increment("llm.prompt_tokens", tokens)
+        
+        max_retries = max_retries or self.max_retries
+        parts = []
         for attempt in range(max_retries):
             try:
-                response = self.model.generate_content(prompt.format(content=content))
-                return response.text
+                with self.rate_limiter.request(tokens + OUTPUT_TOKEN_ESTIMATE):
+                    for chunk in self.model.generate_content(prompt, stream=True):
+                        text = chunk.text
+                        if text:
+                            parts.append(text)
+                            yield text
+                break
             except Exception as e:
-                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise Exception(f"Failed to generate summary after {max_retries} attempts: {str(e)}")
-                time.sleep(2 ** attempt)  # Exponential backoff
+                if parts:
+                    metrics.increment("llm.failures")
+                    raise
+                self._on_failure(e, attempt, max_retries)
+        
+        if key is not None:
+            self.cache.set(key, ''.join(parts))
+
+    def _on_failure(self, error: Exception, attempt: int, max_retries: int) -> None:
+        """Record a failed model request and back off, or re-raise after the last attempt."""
+        throttled = is_rate_limit_error(error)
+        if throttled:
+            self.rate_limiter.on_throttle()
+            metrics.increment("llm.throttled")
+        logger.error(f"Attempt {attempt + 1} failed: {str(error)}")
+        if attempt == max_retries - 1:
+            metrics.increment("llm.failures")
+            raise error
+        metrics.increment("llm.retries")
+        metrics.annotate(retries=attempt + 1)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        time.sleep(random.uniform(0, (4 if throttled else 1) * 2 ** attempt))
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters of the response cache."""
+        if self.cache is None:
+            return {"hits": 0, "misses": 0, "entries": 0}
+        return self.cache.stats()
+        
+    def generate_summary(self, content: str, max_retries: int = 3) -> str:
+        """Generate a summary using Gemini Pro with retry logic."""
+        try:
+            return self._generate(SUMMARY_PROMPT, max_retries=max_retries, content=content)
+        except Exception as e:
+            raise Exception(f"Failed to generate summary after {max_retries} attempts: {str(e)}")
     
-    def extract_key_points(self, content: str) -> List[str]:
-        """Extract key points from content using Gemini Pro."""
-        prompt = """Extract the 5 most important key points from the following content.
-        Format each point as a separate bullet point.
+    def stream_summary(self, content: str, max_retries: int = 3) -> Iterator[str]:
+        """Yield the summary of content piece by piece as Gemini Pro generates it.
         
-        Content:
-        {content}
+        Shares cached responses with generate_summary.
         """
+        try:
+            yield from self._stream(SUMMARY_PROMPT, max_retries=max_retries, content=content)
+        except Exception as e:
+            raise Exception(f"Failed to stream summary: {str(e)}")
+    
+    def analyze_content(self, content: str, max_retries: int = 3) -> Dict[str, Any]:
+        """Generate a summary and key points for content in a single request.
         
+        Falls back to separate generate_summary and extract_key_points calls
+        when the model's response cannot be parsed as structured output.
+        """
+        return self._analyze(ANALYSIS_PROMPT, content, max_retries=max_retries)
+    
+    def reduce_summaries(self, summaries: List[str], max_retries: int = 3) -> Dict[str, Any]:
+        """Combine summaries of a document's sections into one summary and key points."""
+        joined = '\n\n'.join(f"Section {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+        return self._analyze(REDUCE_PROMPT, joined, max_retries=max_retries)
+    
+    def _analyze(self, template: str, content: str, max_retries: int = 3) -> Dict[str, Any]:
+        """Request a structured analysis with retries, falling back to separate calls."""
         try:
-            response = self.model.generate_content(prompt.format(content=content))
-            return [point.strip() for point in response.text.split('\n') if point.strip()]
+            text = self._generate(template, max_retries=max_retries, content=content)
+        except Exception as e:
+            raise Exception(f"Failed to analyze content after {max_retries} attempts: {str(e)}")
+        
+        analysis = parse_analysis(text)
+        if analysis is None:
+            logger.warning("Could not parse structured analysis, falling back to separate requests")
+            return {
+                "summary": self.generate_summary(content),
+                "key_points": self.extract_key_points(content)
+            }
+        return analysis
+    
+    def analyze_batch(self, documents: Dict[str, str], max_retries: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Analyze several documents in one request.
+        
+        Documents analyzed before, alone or in any batch, are answered from
+        the cache and left out of the request; every document the request
+        analyzes is cached on its own under its analyze_content key.
+        Returns summary and key points per document id. Documents the model
+        dropped or merged are missing from the result; callers should retry
+        them with analyze_content.
+        """
+        cached = {}
+        for doc_id, content in documents.items():
+            analysis = self.cached_analysis(content)
+            if analysis is not None:
+                cached[doc_id] = analysis
+        documents = {doc_id: content for doc_id, content in documents.items() if doc_id not in cached}
+        if not documents:
+            return cached
+        
+        rendered = '\n\n'.join(f"[DOCUMENT {doc_id}]\n{content}" for doc_id, content in documents.items())
+        try:
+            text = self._generate(BATCH_ANALYSIS_PROMPT, max_retries=max_retries, documents=rendered)
+            analyses = parse_batch_analysis(text, list(documents))
+        except Exception as e:
+            logger.error(f"Batch analysis of {len(documents)} documents failed: {str(e)}")
+            return cached
+        
+        if len(analyses) < len(documents):
+            logger.warning(f"Batch analysis returned {len(analyses)} of {len(documents)} documents")
+        if self.cache is not None:
+            # Also cache each document on its own, so it is found again whatever batch it lands in
+            for doc_id, analysis in analyses.items():
+                self.cache.set(self._analysis_cache_key(documents[doc_id]), json.dumps(analysis))
+        return dict(cached, **analyses)
+    
+    def cached_analysis(self, content: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis of content, as analyze_content would, without making a request.
+        
+        Returns None when the content has not been analyzed before, alone
+        or as part of a batch.
+        """
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self._analysis_cache_key(content))
+        analysis = parse_analysis(cached) if cached is not None else None
+        if analysis is not None:
+            metrics.increment("llm.cache_hits")
+        return analysis
+    
+    def _analysis_cache_key(self, content: str) -> str:
+        return response_cache_key(self.model_name, ANALYSIS_PROMPT, {'content': content})
+    
+    def synthesize_cluster(self, documents: List[str]) -> Optional[Dict[str, Any]]:
+        """Synthesize the findings of several related sources in one request.
+        
+        ``documents`` are rendered source descriptions, each starting with a
+        ``[SOURCE <n> | <domain>]`` line. Returns topic, synthesis and
+        connections, or None if the request fails or cannot be parsed.
+        """
+        try:
+            text = self._generate(SYNTHESIS_PROMPT, documents='\n\n'.join(documents))
+            synthesis = parse_synthesis(text)
+        except Exception as e:
+            logger.error(f"Synthesis of {len(documents)} sources failed: {str(e)}")
+            return None
+        
+        if synthesis is None:
+            logger.warning(f"Could not parse synthesis of {len(documents)} sources")
+        return synthesis
+    
+    def extract_key_points(self, content: str, max_retries: Optional[int] = None) -> List[str]:
+        """Extract key points from content using Gemini Pro."""
+        try:
+            text = self._generate(KEY_POINTS_PROMPT, max_retries=max_retries, content=content)
+            return [point.strip() for point in text.split('\n') if point.strip()]
         except Exception as e:
             logger.error(f"Failed to extract key points: {str(e)}")
             raise Exception(f"Failed to extract key points: {str(e)}")
     
     def analyze_domain(self, content: str, domain: str) -> Dict[str, str]:
         """Analyze content from a specific domain (academic, news, tech, etc.)."""
-        prompt = """Analyze the following content from a {domain} perspective.
-        Provide:
-        1. Main findings
-        2. Methodology (if applicable)
-        3. Key implications
-        4. Limitations (if any)
-        
-        Content:
-        {content}
-        """
-        
         try:
-            response = self.model.generate_content(prompt.format(domain=domain, content=content))
             return {
-                "analysis": response.text,
+                "analysis": self._generate(DOMAIN_PROMPT, domain=domain, content=content),
                 "domain": domain
             }
         except Exception as e:
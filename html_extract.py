@@ -0,0 +1,106 @@
+import re
+from bs4 import BeautifulSoup
+from typing import List, Optional
+import logging
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+# Elements dropped before extracting text, and elements whose text is kept
+UNWANTED_TAGS = ['script', 'style', 'nav', 'footer', 'header']
+TEXT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+# Parser backends, fastest first; "html.parser" (BeautifulSoup on the stdlib
+# parser) is always available.
+PARSERS = ['selectolax', 'lxml', 'html.parser']
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+# XHTML pages often start with one; lxml refuses str input that declares an encoding
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def available_parsers() -> List[str]:
+    """Return the parser backends that can be used in this environment."""
+    installed = {
+        'selectolax': LexborHTMLParser is not None,
+        'lxml': lxml is not None,
+        'html.parser': True,
+    }
+    return [parser for parser in PARSERS if installed[parser]]
+
+
+def resolve_parser(parser: str = 'auto') -> str:
+    """Map a parser name to an available backend; "auto" picks the fastest one."""
+    available = available_parsers()
+    if parser == 'auto':
+        return available[0]
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser '{parser}', expected 'auto' or one of {PARSERS}")
+    if parser not in available:
+        logger.warning(f"Parser '{parser}' is not installed, falling back to 'html.parser'")
+        return 'html.parser'
+    return parser
+
+
+def is_html(content_type: Optional[str]) -> bool:
+    """Whether a Content-Type header denotes an HTML document (a missing header counts)."""
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def _extract_selectolax(html: str) -> List[str]:
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(UNWANTED_TAGS)
+    return [node.text(deep=True).strip() for node in tree.css(', '.join(TEXT_TAGS))]
+
+
+def _extract_lxml(html: str) -> List[str]:
+    root = lxml.html.document_fromstring(_XML_DECLARATION.sub('', html, count=1))
+    for element in root.xpath(' | '.join(f'//{tag}' for tag in UNWANTED_TAGS)):
+        element.drop_tree()
+    return [element.text_content().strip() for element in root.xpath(' | '.join(f'//{tag}' for tag in TEXT_TAGS))]
+
+
+def _extract_html_parser(html: str) -> List[str]:
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(UNWANTED_TAGS):
+        element.decompose()
+    return [p.get_text().strip() for p in soup.find_all(TEXT_TAGS)]
+
+
+_EXTRACTORS = {
+    'selectolax': _extract_selectolax,
+    'lxml': _extract_lxml,
+    'html.parser': _extract_html_parser,
+}
+
+
+def extract_text(html: str, parser: str = 'auto') -> Optional[str]:
+    """Return the text of headings and paragraphs in an HTML document, or None if there is none.
+
+    A document a fast backend fails to parse is parsed again with
+    "html.parser", which accepts anything.
+    """
+    if not html.strip():
+        return None
+    parser = resolve_parser(parser)
+    try:
+        paragraphs = _EXTRACTORS[parser](html)
+    except Exception as e:
+        if parser == 'html.parser':
+            raise
+        logger.debug(f"{parser} could not parse the document ({str(e)}), falling back to 'html.parser'")
+        paragraphs = _extract_html_parser(html)
+    text = ' '.join(paragraphs)
+    return text if text else None
@@ -1,67 +1,448 @@
 import argparse
-from web_search import WebSearch
+import json
+import re
+import shutil
+import sys
+import tempfile
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
+from web_search import WebSearch, SOURCES, parse_sources
 from summarizer import Summarizer
+from gemini_api import GeminiAPI
+from dedup import deduplicate
+from ranking import rank_results
+from metrics import metrics
+from checkpoint import CheckpointStore, checkpoint_path
+from deadline import Deadline
+from report import ReportWriter
+from findings import FindingsIndex, DEFAULT_MAX_AGE_DAYS, DEFAULT_MIN_RESULTS
 import os
 from datetime import datetime
 
-def save_report(report: str, query: str):
-    """Save the report to a file."""
-    # Create reports directory if it doesn't exist
-    os.makedirs('reports', exist_ok=True)
-    
+# Prior findings used when answering from the index without --top-k
+DEFAULT_INDEX_RESULTS = 10
+
+def report_filename(query: str) -> str:
+    """Return the path a query's report is saved to."""
     # Create filename from query and timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"reports/research_{query.replace(' ', '_')}_{timestamp}.md"
+    slug = re.sub(r'[^\w\-]+', '_', query).strip('_')[:80]
+    return f"reports/research_{slug}_{timestamp}.md"
+
+def parse_source_timeouts(values):
+    """Parse SOURCE=SECONDS pairs into a timeout mapping."""
+    timeouts = {}
+    for value in values or []:
+        source, _, seconds = value.partition('=')
+        if source not in SOURCES or not seconds:
+            raise argparse.ArgumentTypeError(f"Invalid source timeout '{value}', expected SOURCE=SECONDS with SOURCE in {SOURCES}")
+        timeouts[source] = float(seconds)
+    return timeouts
+
+def build_components(args, source_timeouts):
+    """Create the searcher, model client, summarizer and findings index shared by every query of a run."""
+    cache_mode = 'bypass' if args.no_cache else 'refresh' if args.refresh_cache else 'use'
+    searcher = WebSearch(source_timeouts=source_timeouts, cache_mode=cache_mode, sources=args.sources)
+    gemini = GeminiAPI(use_cache=not args.no_cache)
+    summarizer = Summarizer(max_workers=args.workers, host_delay=args.host_delay, gemini=gemini,
+                            combined_analysis=not args.separate_calls,
+                            batch_token_budget=args.batch_token_budget,
+                            chunk_threshold_tokens=args.chunk_threshold,
+                            chunk_tokens=args.chunk_tokens,
+                            max_content_bytes=args.max_page_bytes,
+                            parser=args.parser)
+    index = None if args.no_index else FindingsIndex()
+    return searcher, gemini, summarizer, index
+
+def print_stream_event(kind: str, payload) -> None:
+    """Print one event of Summarizer.stream_search_results to the console."""
+    if kind == 'result':
+        sources = ', '.join(payload.get('sources', [payload['source']]))
+        print(f"\n## {payload['title']}\nSource: {sources} - {payload['url']}\n")
+    elif kind == 'text':
+        print(payload, end='', flush=True)
+    elif payload:
+        print("\n\nKey Points:")
+        for point in payload['key_points']:
+            print(f"- {point}")
+    else:
+        print("(could not be summarized)")
+
+def research(query: str, args, searcher: WebSearch, summarizer: Summarizer, log=print,
+             on_event=None, report_path: Optional[str] = None,
+             index: Optional[FindingsIndex] = None, on_result=None) -> Dict:
+    """Search, deduplicate, rank and summarize one query.
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(report)
+    Returns a record with the query, its status ("ok", "no_results" or
+    "failed"), result counts, the processed results, the synthesized
+    clusters and the elapsed time. With ``report_path``, the markdown
+    report is written there section by section as results complete and
+    the record's ``report_file`` points to it. With ``on_event``, results
+    are summarized one by one and every event of
+    Summarizer.stream_search_results is passed to it as the summaries are
+    generated. ``on_result`` is called with every result as it is added.
     
-    return filename
-
-def main():
-    parser = argparse.ArgumentParser(description='SageScope - Cross-domain Research Assistant')
-    parser.add_argument('query', help='Research query')
-    parser.add_argument('--max-results', type=int, default=5, help='Maximum number of results per source')
-    parser.add_argument('--output', choices=['console', 'file', 'both'], default='both',
-                      help='Output format (console, file, or both)')
+    With ``args.topics_only``, results are not summarized one by one:
+    they keep their search snippets and are clustered into topics, with
+    one model call per topic.
     
-    args = parser.parse_args()
+    Every new result is added to ``index``. With ``args.from_index``, the
+    best matching prior findings are used first; live sources are skipped
+    when there are at least ``args.index_min_results`` of them, and
+    otherwise only results missing from the index or stale are summarized.
     
-    print(f"\n🔍 SageScope Research Assistant")
-    print(f"Query: {args.query}")
-    print("\nSearching across multiple sources...")
+    With ``args.deadline``, every stage is scheduled against the time left
+    (see deadline.Deadline) and the record's ``skipped`` lists the steps
+    that were skipped or cut short to finish on time.
+    """
+    start = time.perf_counter()
+    deadline = Deadline(args.deadline) if args.deadline else None
+    record = {'query': query, 'status': 'ok', 'results_found': 0, 'results_processed': 0,
+              'from_index': 0, 'results': [], 'clusters': [], 'skipped': [], 'report_file': None}
+    writer = ReportWriter(report_path) if report_path else None
+    processed_results = []
+    seen_urls = set()
     
-    # Initialize components
-    searcher = WebSearch()
-    summarizer = Summarizer()
+    def collect(result: Optional[Dict], new: bool = True):
+        if not result or result['url'] in seen_urls:
+            return
+        seen_urls.add(result['url'])
+        processed_results.append(result)
+        if writer is not None:
+            writer.add(result)
+        if on_result is not None:
+            on_result(result)
+        if new and index is not None and not result.get('snippet_only'):
+            index.add(result, query)
+        elif not new:
+            record['from_index'] += 1
+    
+    from_index = index is not None and args.from_index
+    max_age = args.index_max_age * 86400
+    if from_index:
+        lookup_start = time.perf_counter()
+        prior = index.search(query, limit=args.top_k or DEFAULT_INDEX_RESULTS, max_age=max_age)
+        log(f"\nFound {len(prior)} prior findings in the index in {(time.perf_counter() - lookup_start) * 1000:.1f} ms.")
+        for result in prior:
+            log(f"  {result['score']:>6.2f}  {result['title']} - {result['url']}")
+            collect(result, new=False)
     
-    # Perform search
-    search_results = searcher.search_all(args.query, args.max_results)
+    if from_index and record['from_index'] >= args.index_min_results:
+        log("\nAnswering from the index without searching live sources.")
+    else:
+        # Perform search
+        search_results = searcher.search_all(query, args.max_results, concurrent=not args.sequential,
+                                             deadline=deadline)
+        record['results_found'] = len(search_results)
+        
+        if not search_results and not processed_results:
+            log("No results found. Please try a different query.")
+            record['status'] = 'no_results'
+        elif search_results:
+            if not args.no_dedup:
+                found = len(search_results)
+                search_results = deduplicate(search_results)
+                if len(search_results) < found:
+                    log(f"\nCollapsed {found - len(search_results)} duplicate results across sources.")
+            
+            if args.top_k is not None:
+                found = len(search_results)
+                search_results = rank_results(query, search_results, args.top_k)
+                log(f"\nSelected the {len(search_results)} most relevant of {found} results.")
+            
+            if from_index:
+                # Reuse fresh findings for known URLs and only summarize the rest
+                search_results = [result for result in search_results if result['url'] not in seen_urls]
+                pending = []
+                for result in search_results:
+                    known = index.get(result['url'], max_age=max_age)
+                    if known is None:
+                        pending.append(result)
+                    else:
+                        collect(known, new=False)
+                log(f"\nReusing {len(search_results) - len(pending)} findings from the index.")
+                search_results = pending
+            
+            if args.topics_only:
+                # Results show their snippets; the per-topic syntheses below are the only model calls
+                log(f"\nFound {len(search_results)} results. Clustering them into topics...")
+                for result in summarizer.snippet_records(search_results):
+                    collect(result)
+            else:
+                log(f"\nFound {len(search_results)} results. Processing and summarizing...")
+                
+                # Process and summarize results, saving each one as soon as it completes
+                checkpoint = CheckpointStore(checkpoint_path(query), resume=args.resume)
+                if on_event is None:
+                    for _, result in summarizer.iter_search_results(search_results, checkpoint=checkpoint,
+                                                                    ordered=True, deadline=deadline):
+                        collect(result)
+                else:
+                    for kind, payload in summarizer.stream_search_results(search_results, checkpoint=checkpoint,
+                                                                          deadline=deadline):
+                        on_event(kind, payload)
+                        if kind == 'record':
+                            collect(payload)
+    record['results_processed'] = len(processed_results)
+    
+    clusters = []
+    if processed_results and not args.no_synthesis:
+        clusters = summarizer.synthesize(processed_results, threshold=args.cluster_threshold, deadline=deadline,
+                                         min_size=1 if args.topics_only else 2)
+        log(f"\nTopics synthesized across related results: {len(clusters)}")
+    if deadline is not None:
+        record['skipped'] = deadline.notes()
+        log(f"\n⏱️ Deadline: {deadline.elapsed():.1f}s of {args.deadline:g}s used before writing the report.")
+        for step in record['skipped']:
+            log(f"  Skipped: {step}")
+    
+    if not processed_results:
+        if record['status'] == 'ok':
+            log("Failed to process any results. Please try again.")
+            record['status'] = 'failed'
+        if writer is not None:
+            writer.discard()
+    else:
+        record['results'] = processed_results
+        record['clusters'] = clusters
+        if writer is not None:
+            record['report_file'] = writer.finish(processed_results, clusters, record['skipped'])
+    
+    record['duration'] = round(time.perf_counter() - start, 3)
+    return record
+
+def print_run_summary(args, gemini: GeminiAPI):
+    """Print cache statistics and the timing breakdown, and export metrics if requested."""
+    if gemini.cache is not None:
+        # Requests answered from the cache and requests sent to the model. The
+        # SQLite counters also count internal lookups, such as the per-document
+        # check before a batch, so they overstate misses.
+        hits = metrics.counters.get('llm.cache_hits', 0)
+        misses = metrics.counters.get('llm.cache_misses', 0)
+        print(f"\nModel response cache: {hits:g} hits, {misses:g} misses")
     
-    if not search_results:
-        print("No results found. Please try a different query.")
+    print("\n⏱️ Timing breakdown\n")
+    print(metrics.format_breakdown())
+    if args.trace:
+        metrics.export_json(args.trace)
+        print(f"\nTrace saved to: {args.trace}")
+    if args.metrics_file:
+        metrics.export_prometheus(args.metrics_file)
+        print(f"Metrics saved to: {args.metrics_file}")
+
+def read_queries(path: str) -> List[str]:
+    """Read one query per line from a file or stdin ("-"), skipping blanks and # comments."""
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def run_batch(args, searcher: WebSearch, gemini: GeminiAPI, summarizer: Summarizer,
+              index: Optional[FindingsIndex] = None):
+    """Research many queries with bounded concurrency, writing one JSONL record per query."""
+    queries = read_queries(args.batch)
+    if not queries:
+        print("No queries to run.")
         return
     
-    print(f"\nFound {len(search_results)} results. Processing and summarizing...")
+    jsonl_path = args.jsonl
+    if not jsonl_path:
+        os.makedirs('reports', exist_ok=True)
+        jsonl_path = f"reports/batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
     
-    # Process and summarize results
-    processed_results = summarizer.process_search_results(search_results)
+    print(f"\n🔍 SageScope batch research: {len(queries)} queries, {args.concurrency} at a time")
     
-    if not processed_results:
-        print("Failed to process any results. Please try again.")
+    statuses = {}
+    results_processed = 0
+    start = time.perf_counter()
+    
+    def run_one(position: int, query: str) -> Dict:
+        report_path = report_filename(query) if args.markdown else None
+        try:
+            record = research(query, args, searcher, summarizer, log=lambda message: None,
+                              report_path=report_path, index=index)
+        except Exception as e:
+            record = {'query': query, 'status': 'error', 'error': str(e), 'results_found': 0,
+                      'results_processed': 0, 'results': [], 'report_file': None}
+        record['index'] = position
+        return record
+    
+    concurrency = max(1, args.concurrency)
+    pending_queries = iter(enumerate(queries))
+    running = set()
+    done = 0
+    with open(jsonl_path, 'w', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="query") as executor:
+        while True:
+            # Submit queries as slots free up so finished records are not held until the end
+            for position, query in itertools.islice(pending_queries, concurrency - len(running)):
+                running.add(executor.submit(run_one, position, query))
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                done += 1
+                statuses[record['status']] = statuses.get(record['status'], 0) + 1
+                results_processed += record['results_processed']
+                print(f"[{done}/{len(queries)}] {record['status']:<10} {record.get('duration', 0):>7.1f}s  {record['query']}")
+    
+    elapsed = time.perf_counter() - start
+    print(f"\nResults saved to: {jsonl_path}")
+    print(f"\n📈 Throughput: {len(queries)} queries in {elapsed:.1f}s "
+          f"({len(queries) / elapsed * 60:.1f} queries/min, {results_processed / elapsed * 60:.1f} results/min)")
+    print("Status: " + ', '.join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    print(f"Model calls: {metrics.counters.get('llm.calls', 0):g}")
+    print_run_summary(args, gemini)
+
+def build_parser() -> argparse.ArgumentParser:
+    """Return the command-line options parser, also used for the defaults of the research service."""
+    parser = argparse.ArgumentParser(description='SageScope - Cross-domain Research Assistant')
+    parser.add_argument('query', nargs='?', help='Research query')
+    parser.add_argument('--batch', metavar='FILE',
+                      help='Research every query in FILE (one per line, "-" for stdin) instead of a single query')
+    parser.add_argument('--concurrency', type=int, default=4,
+                      help='Number of queries researched at once in batch mode')
+    parser.add_argument('--jsonl', metavar='PATH',
+                      help='Where batch mode writes its JSONL records (default: reports/batch_<timestamp>.jsonl)')
+    parser.add_argument('--markdown', action='store_true',
+                      help='Also save a markdown report per query in batch mode')
+    parser.add_argument('--max-results', type=int, default=5, help='Maximum number of results per source')
+    parser.add_argument('--output', choices=['console', 'file', 'both'], default='both',
+                      help='Output format (console, file, or both)')
+    parser.add_argument('--from-index', action='store_true',
+                      help='Answer from findings of earlier runs first and only go to live sources for what is missing or stale')
+    parser.add_argument('--index-min-results', type=int, default=DEFAULT_MIN_RESULTS,
+                      help=f'Prior findings that make --from-index skip live sources (default: {DEFAULT_MIN_RESULTS})')
+    parser.add_argument('--index-max-age', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                      help=f'Days after which indexed findings are stale (default: {DEFAULT_MAX_AGE_DAYS})')
+    parser.add_argument('--no-index', action='store_true',
+                      help='Do not record processed results in the findings index (disables --from-index)')
+    parser.add_argument('--no-synthesis', action='store_true',
+                      help='Skip clustering related results and the cross-domain synthesis section')
+    # No default here: importing clustering would load scipy on every start-up
+    parser.add_argument('--cluster-threshold', type=float,
+                      help='Average TF-IDF cosine similarity for results to share a topic (default: 0.2)')
+    parser.add_argument('--topics-only', action='store_true',
+                      help='Skip per-result summaries: cluster results on their titles and snippets and make one '
+                           'model call per topic')
+    parser.add_argument('--stream', action='store_true',
+                      help='Print each summary as the model writes it instead of waiting for the full report')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                      help='Answer within this many seconds: slow sources are cancelled, and search snippets '
+                           'and shorter prompts replace page extraction and full prompts as time runs out')
+    parser.add_argument('--sources', metavar='LIST',
+                      help=f"Comma-separated sources to query (default: all of {','.join(SOURCES)})")
+    parser.add_argument('--sequential', action='store_true',
+                      help='Query sources one after another instead of in parallel')
+    parser.add_argument('--source-timeout', action='append', metavar='SOURCE=SECONDS',
+                      help='Deadline for a single source in parallel mode (repeatable)')
+    parser.add_argument('--no-dedup', action='store_true',
+                      help='Keep duplicate results returned by several sources')
+    parser.add_argument('--top-k', '--budget', dest='top_k', type=int,
+                      help='Only summarize the K results most relevant to the query')
+    parser.add_argument('--workers', type=int, default=4,
+                      help='Number of results extracted and summarized concurrently')
+    parser.add_argument('--host-delay', type=float, default=1.0,
+                      help='Minimum seconds between page requests to the same host')
+    parser.add_argument('--separate-calls', action='store_true',
+                      help='Request summary and key points in two model calls instead of one')
+    parser.add_argument('--batch-token-budget', type=int, default=6000,
+                      help='Pack short documents into shared model requests up to this many tokens (0 disables)')
+    parser.add_argument('--chunk-threshold', type=int, default=8000,
+                      help='Summarize content longer than this many tokens chunk by chunk')
+    parser.add_argument('--chunk-tokens', type=int, default=4000,
+                      help='Maximum size of each chunk in tokens')
+    parser.add_argument('--max-page-bytes', type=int, default=2_000_000,
+                      help='Stop downloading a page after this many bytes')
+    parser.add_argument('--parser', choices=['auto', 'selectolax', 'lxml', 'html.parser'], default='auto',
+                      help='HTML parser backend used to extract page text')
+    parser.add_argument('--resume', action='store_true',
+                      help='Reuse results already completed by an interrupted run of the same query')
+    parser.add_argument('--trace', metavar='PATH',
+                      help='Write timing spans and counters of the run as JSON')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                      help='Write run metrics in the Prometheus text format')
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', action='store_true',
+                      help='Bypass the search result and model response caches')
+    cache_group.add_argument('--refresh-cache', action='store_true',
+                      help='Ignore cached search results and store fresh ones')
+    return parser
+
+def parse_options(parser: argparse.ArgumentParser, argv: Optional[List[str]] = None):
+    """Parse and check the research options, returning the arguments and the source timeouts."""
+    args = parser.parse_args(argv)
+    if args.from_index and args.no_index:
+        parser.error('--from-index cannot be combined with --no-index')
+    if args.topics_only and args.no_synthesis:
+        parser.error('--topics-only cannot be combined with --no-synthesis')
+    if args.deadline is not None and args.deadline <= 0:
+        parser.error('--deadline must be a positive number of seconds')
+    try:
+        source_timeouts = parse_source_timeouts(args.source_timeout)
+        if args.sources:
+            args.sources = parse_sources(args.sources)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+    return args, source_timeouts
+
+def main():
+    parser = build_parser()
+    args, source_timeouts = parse_options(parser)
+    if not args.query and not args.batch:
+        parser.error('a query or --batch FILE is required')
+    if args.stream and args.batch:
+        parser.error('--stream cannot be combined with --batch')
+    if args.stream and args.topics_only:
+        parser.error('--stream cannot be combined with --topics-only')
+    
+    metrics.reset()
+    
+    if args.batch:
+        # Initialize components once and share them between all queries
+        searcher, gemini, summarizer, index = build_components(args, source_timeouts)
+        run_batch(args, searcher, gemini, summarizer, index)
         return
     
-    # Generate report
-    report = summarizer.generate_report(processed_results)
+    print(f"\n🔍 SageScope Research Assistant")
+    print(f"Query: {args.query}")
+    print("\nChecking earlier findings..." if args.from_index else "\nSearching across multiple sources...")
+    
+    # Initialize components
+    searcher, gemini, summarizer, index = build_components(args, source_timeouts)
     
-    # Output handling
-    if args.output in ['console', 'both']:
-        print("\n" + "="*80 + "\n")
-        print(report)
+    # The report is always written to disk as results complete; a console-only
+    # run writes it to a temporary directory and removes it afterwards
+    save = args.output in ['file', 'both']
+    scratch_dir = None if save else tempfile.mkdtemp(prefix='sagescope_')
+    report_path = report_filename(args.query) if save else os.path.join(scratch_dir, 'report.md')
+    try:
+        record = research(args.query, args, searcher, summarizer,
+                          on_event=print_stream_event if args.stream else None, report_path=report_path,
+                          index=index)
+        if record['status'] != 'ok':
+            return
+        
+        # Output handling; streamed summaries are already on the console
+        if args.output in ['console', 'both'] and not args.stream:
+            print("\n" + "="*80 + "\n")
+            with open(record['report_file'], encoding='utf-8') as f:
+                shutil.copyfileobj(f, sys.stdout)
+        
+        if save:
+            print(f"\nReport saved to: {record['report_file']}")
+    finally:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
     
-    if args.output in ['file', 'both']:
-        filename = save_report(report, args.query)
-        print(f"\nReport saved to: {filename}")
+    print_run_summary(args, gemini)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
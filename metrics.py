@@ -0,0 +1,175 @@
+import functools
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+# Quantiles reported per span name
+QUANTILES = (0.5, 0.95)
+
+
+def _quantile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _metric_name(name: str) -> str:
+    return 'sagescope_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+class Metrics:
+    """Lightweight in-process timing spans and counters.
+
+    Spans are recorded with their duration, attributes and parent span
+    (within the same thread). Counters are plain running totals. Both can
+    be exported as a JSON trace or in the Prometheus text format. With
+    ``max_spans``, only the most recent spans are kept, which bounds memory
+    in long-running processes.
+    """
+
+    def __init__(self, max_spans: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.max_spans = max_spans
+        self.reset()
+
+    def reset(self):
+        """Forget every span and counter, e.g. at the start of a run."""
+        with self._lock:
+            self.started_at = time.time()
+            self._origin = time.perf_counter()
+            self.spans: Deque[Dict[str, Any]] = deque(maxlen=self.max_spans)
+            self.counters: Dict[str, float] = {}
+            self._next_id = 0
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """Time the enclosed block. The yielded attribute dict can be updated inside it."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+        parent = stack[-1][0] if stack else None
+        stack.append((span_id, attributes))
+
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield attributes
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self.spans.append({
+                    'id': span_id,
+                    'parent': parent,
+                    'name': name,
+                    'start': round(start - self._origin, 6),
+                    'duration': round(end - start, 6),
+                    'status': status,
+                    'thread': threading.current_thread().name,
+                    'attributes': attributes,
+                })
+
+    def timed(self, name: str):
+        """Decorator recording every call of the function as a span."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def annotate(self, **attributes: Any):
+        """Add attributes to the innermost open span of the current thread, if any."""
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1][1].update(attributes)
+
+    def increment(self, name: str, value: float = 1):
+        """Add value to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per span name: call count, total, quantiles and max of the durations."""
+        with self._lock:
+            durations: Dict[str, List[float]] = {}
+            for span in self.spans:
+                durations.setdefault(span['name'], []).append(span['duration'])
+        summary = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            summary[name] = {'count': len(values), 'total': sum(values), 'max': values[-1]}
+            for fraction in QUANTILES:
+                summary[name][f"p{int(fraction * 100)}"] = _quantile(values, fraction)
+        return summary
+
+    def trace(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'spans': list(self.spans),
+                'counters': dict(self.counters),
+            }
+
+    def export_json(self, path: str):
+        """Write every span and counter of the run as a JSON trace."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.trace(), f, indent=2, default=str)
+
+    def prometheus_text(self) -> str:
+        """Render span summaries and counters in the Prometheus text exposition format."""
+        lines = [
+            '# HELP sagescope_span_seconds Duration of instrumented operations.',
+            '# TYPE sagescope_span_seconds summary',
+        ]
+        for name, stats in self.summary().items():
+            for fraction in QUANTILES:
+                lines.append(
+                    f'sagescope_span_seconds{{span="{name}",quantile="{fraction}"}} '
+                    f'{stats[f"p{int(fraction * 100)}"]:.6f}'
+                )
+            lines.append(f'sagescope_span_seconds_sum{{span="{name}"}} {stats["total"]:.6f}')
+            lines.append(f'sagescope_span_seconds_count{{span="{name}"}} {stats["count"]}')
+        with self._lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            metric = _metric_name(name) + '_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path: str):
+        """Write the Prometheus text format to a file, e.g. for node_exporter's textfile collector."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+
+    def format_breakdown(self) -> str:
+        """Human-readable table of time spent per span name, plus counters."""
+        lines = [f"{'operation':<22}{'calls':>7}{'total (s)':>12}{'p50 (s)':>10}{'p95 (s)':>10}{'max (s)':>10}"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<22}{stats['count']:>7}{stats['total']:>12.2f}{stats['p50']:>10.2f}"
+                f"{stats['p95']:>10.2f}{stats['max']:>10.2f}"
+            )
+        with self._lock:
+            counters = sorted(self.counters.items())
+        if counters:
+            lines.append('')
+            lines.extend(f"{name:<22}{value:>19g}" for name, value in counters)
+        return '\n'.join(lines)
+
+
+# Process-wide registry used by the search, extraction and model code
+metrics = Metrics()
@@ -0,0 +1,76 @@
+import re
+from typing import Dict, List, Optional
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is',
+    'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'with',
+}
+
+# Titles are short and precise, so their terms count this many times
+TITLE_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory Okapi BM25 index with vectorized scoring.
+
+    Term frequencies are kept in a dense (documents x vocabulary) NumPy
+    matrix, so scoring a query is a handful of array operations over the
+    columns of its terms rather than a Python loop over documents.
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        tokenized = [tokenize(document) for document in documents]
+
+        self.vocabulary: Dict[str, int] = {}
+        for tokens in tokenized:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        self.term_frequencies = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(tokenized):
+            for token in tokens:
+                self.term_frequencies[row, self.vocabulary[token]] += 1
+
+        self.doc_lengths = self.term_frequencies.sum(axis=1)
+        average_length = self.doc_lengths.mean() if len(documents) else 0.0
+        self.length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(average_length, 1e-9))
+
+        document_frequencies = (self.term_frequencies > 0).sum(axis=0)
+        self.idf = np.log(1 + (len(documents) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Return the BM25 score of every document for query."""
+        columns = [self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary]
+        if not columns:
+            return np.zeros(self.term_frequencies.shape[0], dtype=np.float32)
+        tf = self.term_frequencies[:, columns]
+        weighted = tf * (self.k1 + 1) / (tf + self.length_norm[:, None])
+        return weighted @ self.idf[columns]
+
+
+def rank_results(query: str, results: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+    """Order search results by BM25 relevance of their title and snippet to query.
+
+    Each returned result carries its ``score``. Ties keep their original
+    order. With ``top_k`` only the best ``top_k`` results are returned.
+    """
+    if not results:
+        return []
+    documents = [
+        ' '.join([result.get('title') or ''] * TITLE_WEIGHT + [result.get('snippet') or ''])
+        for result in results
+    ]
+    scores = BM25Index(documents).scores(query)
+    order = sorted(range(len(results)), key=lambda i: (-scores[i], i))
+    if top_k is not None:
+        order = order[:max(top_k, 0)]
+    return [dict(results[i], score=round(float(scores[i]), 4)) for i in order]
@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HostRateLimiter:
+    """Enforce a minimum interval between requests to the same host.
+
+    Requests to different hosts never wait on each other. Each caller reserves
+    the next free slot for its host under a lock and sleeps outside of it, so
+    the limiter is safe to share between worker threads.
+    """
+
+    def __init__(self, min_interval: float = 1.0, host_intervals: Optional[Dict[str, float]] = None):
+        self.min_interval = min_interval
+        self.host_intervals = {host.lower(): interval for host, interval in (host_intervals or {}).items()}
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> float:
+        """Block until a request to the host of ``url`` is allowed. Returns the time slept."""
+        host = urlparse(url).netloc.lower()
+        interval = self.host_intervals.get(host, self.min_interval)
+        if interval <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate_per_minute``.
+
+    ``reserve`` never refuses: a request larger than the available tokens
+    puts the bucket into debt and returns how long the caller must wait, so
+    concurrent callers queue up fairly instead of spinning.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveConcurrencyLimiter:
+    """Cap in-flight requests with a limit that adapts to the backend (AIMD).
+
+    Every success raises the limit by ``1 / limit`` (about one slot per
+    window of successful requests) unless the call was slower than
+    ``target_latency``, which shrinks it by 10%. A throttling response
+    halves it.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16,
+                 target_latency: Optional[float] = None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        with self._condition:
+            if self.target_latency is not None and latency > self.target_latency:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+            logger.info(f"Throttled by backend, concurrency limit lowered to {int(self.limit)}")
+
+
+class ModelRateLimiter:
+    """Process-wide throttle for model calls.
+
+    Combines a requests-per-minute bucket, a tokens-per-minute bucket and an
+    adaptive cap on in-flight requests. Wrap each call in ``request`` and
+    report 429 responses with ``on_throttle``.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 120_000,
+                 max_concurrency: int = 8, target_latency: Optional[float] = 30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=max(1, max_concurrency // 2), maximum=max_concurrency, target_latency=target_latency
+        )
+
+    @contextmanager
+    def request(self, tokens: int) -> Iterator[None]:
+        """Wait for quota for a request of ``tokens`` estimated tokens, then hold a concurrency slot."""
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if delay > 0:
+            logger.debug(f"Rate limit reached, waiting {delay:.2f}s")
+            time.sleep(delay)
+
+        self.concurrency.acquire()
+        start = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self.concurrency.release()
+            if succeeded:
+                self.concurrency.on_success(time.monotonic() - start)
+
+    def on_throttle(self):
+        self.concurrency.on_throttle()
@@ -0,0 +1,118 @@
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional
+from metrics import metrics
+
+REPORT_HEADER = "# Research Report\n\n"
+
+
+def format_result(result: Dict) -> str:
+    """Render the report section of one processed result."""
+    sources = ', '.join(result.get('sources', [result['source']]))
+    lines = [
+        f"## {result['title']}",
+        f"Source: {sources} - {result['url']}",
+        "",
+    ]
+    if result.get('snippet_only'):
+        # Not summarized in time; the search snippet stands in for the summary
+        lines.extend(["### Search Snippet", result['summary']])
+    else:
+        lines.extend(["### Summary", result['summary'], "", "### Key Points"])
+        lines.extend(f"- {point}" for point in result['key_points'])
+    lines.extend(["", "---", "", ""])
+    return '\n'.join(lines)
+
+
+def format_cluster(cluster: Dict, processed_results: List[Dict]) -> str:
+    """Render the synthesis of one cluster of related results."""
+    lines = [
+        f"### {cluster['topic']}",
+        f"Domains: {', '.join(cluster['domains'])}",
+        "",
+        cluster['synthesis'],
+        "",
+    ]
+    if cluster['connections']:
+        lines.append("#### Connections")
+        lines.extend(f"- {connection}" for connection in cluster['connections'])
+        lines.append("")
+    lines.append("#### Sources")
+    for number, index in enumerate(cluster['members'], 1):
+        result = processed_results[index]
+        lines.append(f"{number}. {result['title']} ({result['source']}) - {result['url']}")
+    lines.extend(["", "---", "", ""])
+    return '\n'.join(lines)
+
+
+def format_skipped(skipped: List[str]) -> str:
+    """Render the steps a deadline-driven run skipped or cut short."""
+    lines = ["## Skipped to Meet the Deadline", ""]
+    lines.extend(f"- {step}" for step in skipped)
+    lines.extend(["", "---", "", ""])
+    return '\n'.join(lines)
+
+
+def iter_synthesis(processed_results: List[Dict], clusters: Optional[List[Dict]]) -> Iterator[str]:
+    """Yield the cross-domain synthesis section, if there are clusters."""
+    if clusters:
+        yield "## Cross-Domain Synthesis\n\n"
+        for cluster in clusters:
+            yield format_cluster(cluster, processed_results)
+
+
+def iter_report(processed_results: List[Dict], clusters: Optional[List[Dict]] = None,
+                skipped: Optional[List[str]] = None) -> Iterator[str]:
+    """Yield the report section by section, so it never has to be built by concatenation."""
+    yield REPORT_HEADER
+    if skipped:
+        yield format_skipped(skipped)
+    yield from iter_synthesis(processed_results, clusters)
+    for result in processed_results:
+        yield format_result(result)
+
+
+class ReportWriter:
+    """Write a research report to disk section by section as results complete.
+
+    Result sections are appended to ``<path>.partial`` and flushed right
+    away, so they are not kept in memory and survive an interrupted run.
+    ``finish`` writes the header, the steps skipped to meet a deadline and
+    the synthesis section to ``path`` and copies the result sections after
+    them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.partial_path = path + '.partial'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+        self.sections = 0
+
+    def add(self, result: Dict):
+        """Append the section of one processed result."""
+        self._file.write(format_result(result))
+        self._file.flush()
+        self.sections += 1
+
+    @metrics.timed("report")
+    def finish(self, processed_results: List[Dict], clusters: Optional[List[Dict]] = None,
+               skipped: Optional[List[str]] = None) -> str:
+        """Assemble the final report file and return its path."""
+        self._file.close()
+        with open(self.path, 'w', encoding='utf-8') as out:
+            out.write(REPORT_HEADER)
+            if skipped:
+                out.write(format_skipped(skipped))
+            for section in iter_synthesis(processed_results, clusters):
+                out.write(section)
+            with open(self.partial_path, encoding='utf-8') as sections:
+                shutil.copyfileobj(sections, out)
+        os.remove(self.partial_path)
+        return self.path
+
+    def discard(self):
+        """Remove the partial report, e.g. when no result could be processed."""
+        self._file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
@@ -0,0 +1,419 @@
+"""Resident HTTP research service.
+
+Keeps the searcher, model client, summarizer and findings index warm
+between requests, so a query does not pay for process start-up, SDK
+imports and client setup. Identical queries that arrive while one is
+already running are coalesced onto that job instead of being searched and
+summarized again.
+
+Endpoints:
+    POST /research            {"query": ..., "max_results"?, "top_k"?, "from_index"?, "deadline"?}
+                              -> 202 {"job_id", "status", "coalesced"}
+    GET  /jobs/<id>           job status, and the record once it is done
+    GET  /jobs/<id>/stream    progress events as NDJSON until the job ends
+    GET  /jobs/<id>/report    markdown report of a finished job
+    GET  /health              liveness and job counts
+    GET  /metrics             Prometheus text metrics
+
+Usage:
+    python server.py [--host HOST] [--port PORT] [--max-jobs N] [main.py options]
+"""
+import copy
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import logging
+from main import build_components, build_parser, parse_options, research
+from metrics import metrics
+from report import iter_report
+from web_search import SOURCE_MODULES, load_sdk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Jobs run at the same time; further jobs wait in the executor queue
+DEFAULT_MAX_JOBS = 4
+
+# Finished jobs are forgotten this many seconds after they end
+DEFAULT_JOB_TTL = 3600
+
+# Spans kept in memory, so a long-running service does not grow without bound
+MAX_SPANS = 10000
+
+# Per-request overrides of the service defaults, with their types
+REQUEST_OPTIONS = {
+    "max_results": int,
+    "top_k": int,
+    "from_index": bool,
+    "deadline": float,
+}
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used to coalesce identical requests."""
+    return ' '.join(query.lower().split())
+
+
+class Job:
+    """One research run and the progress events it has produced so far."""
+
+    def __init__(self, key: Tuple, query: str, options: Dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.query = query
+        self.options = options
+        self.status = "queued"
+        self.subscribers = 1
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.record: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def emit(self, event: str, **payload):
+        """Append a progress event and wake up every stream waiting for one."""
+        with self._changed:
+            self.events.append(dict(payload, event=event, time=round(time.time() - self.created_at, 3)))
+            self._changed.notify_all()
+
+    def log(self, message: str):
+        self.emit("log", message=message.strip())
+
+    def add_result(self, result: Dict):
+        self.emit("result", result=result)
+
+    def start(self):
+        self._set_status("running")
+
+    def finish(self, record: Optional[Dict] = None, error: Optional[str] = None):
+        self.record = record
+        self.error = error
+        self.finished_at = time.time()
+        self._set_status("failed" if error else "done")
+
+    def _set_status(self, status: str):
+        # Under the same lock as its event, so a stream that sees the job done has that event too
+        with self._changed:
+            self.status = status
+            self.emit("status", status=status)
+
+    def wait_events(self, position: int, timeout: float = 15.0) -> List[Dict]:
+        """Return the events after position, waiting up to timeout seconds for one if there are none yet."""
+        with self._changed:
+            if position >= len(self.events) and not self.done:
+                self._changed.wait(timeout)
+            return self.events[position:]
+
+    def to_dict(self) -> Dict:
+        job = {
+            'job_id': self.id,
+            'query': self.query,
+            'options': self.options,
+            'status': self.status,
+            'subscribers': self.subscribers,
+            'events': len(self.events),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if self.error:
+            job['error'] = self.error
+        if self.record is not None:
+            job['record'] = self.record
+        return job
+
+
+class JobManager:
+    """Runs jobs on a bounded pool, coalescing identical in-flight requests (singleflight).
+
+    A request whose key matches a queued or running job is attached to that
+    job instead of starting another one. Once a job ends, the next identical
+    request starts a fresh run.
+    """
+
+    def __init__(self, run: Callable[[Job], Dict], max_jobs: int = DEFAULT_MAX_JOBS,
+                 ttl: float = DEFAULT_JOB_TTL):
+        self._run = run
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._in_flight: Dict[Tuple, Job] = {}
+
+    def submit(self, query: str, options: Dict) -> Tuple[Job, bool]:
+        """Return the job answering query with options, and whether it was already in flight."""
+        key = (normalize_query(query), tuple(sorted(options.items())))
+        with self._lock:
+            self._prune()
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                metrics.increment("service.coalesced")
+                return job, True
+            job = Job(key, query, options)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        metrics.increment("service.jobs")
+        self._executor.submit(self._execute, job)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _execute(self, job: Job):
+        job.start()
+        try:
+            with metrics.span("service.job", query=job.query):
+                record = self._run(job)
+            job.finish(record)
+        except Exception as e:
+            logger.exception(f"Research job {job.id} failed")
+            job.finish(error=str(e))
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _prune(self):
+        oldest = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < oldest]:
+            del self._jobs[job_id]
+
+
+class ResearchService:
+    """Research components shared by every request, and the jobs running on them."""
+
+    def __init__(self, args, searcher, gemini, summarizer, index=None, max_jobs: int = DEFAULT_MAX_JOBS,
+                 job_ttl: float = DEFAULT_JOB_TTL):
+        self.args = args
+        self.searcher = searcher
+        self.gemini = gemini
+        self.summarizer = summarizer
+        self.index = index
+        self.started_at = time.time()
+        self.jobs = JobManager(self.run, max_jobs=max_jobs, ttl=job_ttl)
+
+    def warm_up(self):
+        """Import the source SDKs and create the API clients before the first request."""
+        start = time.perf_counter()
+        for source in self.searcher.sources:
+            if source in SOURCE_MODULES:
+                try:
+                    load_sdk(source)
+                except ImportError as e:
+                    logger.warning(f"Could not load the {source} SDK: {str(e)}")
+        clients = [lambda: self.gemini.model]
+        if "pubmed" in self.searcher.sources:
+            clients.append(lambda: self.searcher.pubmed_client)
+        if "tavily" in self.searcher.sources:
+            clients.append(lambda: self.searcher.tavily_client)
+        for client in clients:
+            try:
+                client()
+            except Exception as e:
+                logger.warning(f"Could not create an API client: {str(e)}")
+        logger.info(f"Warmed up in {time.perf_counter() - start:.2f}s")
+
+    def parse_request(self, body: Dict) -> Tuple[str, Dict]:
+        """Return the query and option overrides of a research request, raising ValueError if invalid."""
+        query = body.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("'query' must be a non-empty string")
+        options = {}
+        for name, value in body.items():
+            if name == 'query':
+                continue
+            kind = REQUEST_OPTIONS.get(name)
+            if kind is None:
+                raise ValueError(f"Unknown option '{name}', expected one of {sorted(REQUEST_OPTIONS)}")
+            if value is None:
+                continue
+            # bool is a subclass of int, so it has to be ruled out explicitly
+            accepted = (int, float) if kind is float else kind
+            if not isinstance(value, accepted) or (kind is not bool and isinstance(value, bool)):
+                raise ValueError(f"'{name}' must be of type {kind.__name__}")
+            if kind is int and value < 1:
+                raise ValueError(f"'{name}' must be at least 1")
+            if kind is float and value <= 0:
+                raise ValueError(f"'{name}' must be positive")
+            options[name] = value
+        if options.get('from_index') and self.index is None:
+            raise ValueError("'from_index' needs the findings index, which is disabled")
+        return query.strip(), options
+
+    def run(self, job: Job) -> Dict:
+        args = copy.copy(self.args)
+        for name, value in job.options.items():
+            setattr(args, name, value)
+        return research(job.query, args, self.searcher, self.summarizer, log=job.log,
+                        index=self.index, on_result=job.add_result)
+
+
+class ResearchHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a ResearchService, available as ``self.server.service``."""
+
+    server_version = "SageScope"
+
+    @property
+    def service(self) -> ResearchService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def send_json(self, payload: Dict, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str):
+        self.send_json({'error': message}, status)
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path != '/research':
+            self.send_error_json(404, f"No such endpoint: {path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("the request body must be a JSON object")
+            query, options = self.service.parse_request(body)
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+        job, coalesced = self.service.jobs.submit(query, options)
+        self.send_json({'job_id': job.id, 'status': job.status, 'coalesced': coalesced}, 202)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['health']:
+            self.send_json({'status': 'ok', 'uptime': round(time.time() - self.service.started_at, 1),
+                            'jobs': self.service.jobs.counts()})
+        elif parts == ['metrics']:
+            body = metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                self.send_error_json(404, f"No such job: {parts[1]}")
+            elif len(parts) == 2:
+                self.send_json(job.to_dict())
+            elif parts[2] == 'stream':
+                since = parse_qs(url.query).get('since', ['0'])[0]
+                self.stream_events(job, int(since) if since.isdigit() else 0)
+            elif parts[2] == 'report':
+                self.send_report(job)
+            else:
+                self.send_error_json(404, f"No such endpoint: {url.path}")
+        else:
+            self.send_error_json(404, f"No such endpoint: {url.path}")
+
+    def stream_events(self, job: Job, position: int = 0):
+        """Write the job's events as NDJSON, one line each as they happen, until it ends."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                events = job.wait_events(position)
+                for event in events:
+                    self.wfile.write(json.dumps(event, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                position += len(events)
+                if job.done and position >= len(job.events):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Stream of job {job.id} closed by the client")
+        self.close_connection = True
+
+    def send_report(self, job: Job):
+        if not job.done:
+            self.send_error_json(409, f"Job {job.id} is still {job.status}")
+            return
+        if not job.record or not job.record.get('results'):
+            self.send_error_json(404, f"Job {job.id} has no results")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.end_headers()
+        for section in iter_report(job.record['results'], job.record.get('clusters'), job.record.get('skipped')):
+            self.wfile.write(section.encode('utf-8'))
+        self.close_connection = True
+
+
+def create_server(service: ResearchService, host: str = DEFAULT_HOST,
+                  port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Bind the HTTP server of a service; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), ResearchHandler)
+    server.service = service
+    return server
+
+
+def main():
+    parser = build_parser()
+    parser.description = 'SageScope research service; the research options set the defaults of every request'
+    service_group = parser.add_argument_group('service options')
+    service_group.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on')
+    service_group.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    service_group.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS,
+                               help='Research jobs run at the same time')
+    service_group.add_argument('--job-ttl', type=float, default=DEFAULT_JOB_TTL,
+                               help='Seconds finished jobs are kept for polling')
+    args, source_timeouts = parse_options(parser)
+    if args.query or args.batch:
+        parser.error('the service takes queries over HTTP, not on the command line')
+
+    metrics.max_spans = MAX_SPANS
+    metrics.reset()
+    searcher, gemini, summarizer, index = build_components(args, source_timeouts)
+    service = ResearchService(args, searcher, gemini, summarizer, index,
+                              max_jobs=args.max_jobs, job_ttl=args.job_ttl)
+    service.warm_up()
+
+    server = create_server(service, args.host, args.port)
+    print(f"SageScope research service listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.jobs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
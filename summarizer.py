@@ -1,90 +1,659 @@
+import queue
+import threading
 import requests
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from urllib.parse import urlparse
-import time
-from gemini_api import GeminiAPI
+import logging
+import re
+from gemini_api import GeminiAPI, estimate_tokens
+from checkpoint import CheckpointStore
+from deadline import (Deadline, EXTRACT_MIN_LEFT, FINISH_MIN_LEFT, SHORT_PROMPT_TOKENS, SYNTHESIS_MIN_LEFT,
+                      FULL, SHORT, SNIPPET)
+from html_extract import extract_text, is_html, resolve_parser
+from metrics import metrics
+from rate_limit import HostRateLimiter
+from report import iter_report
+from workers import DaemonThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Seconds to wait for a page; under a deadline pages are not fetched with less time than MIN_PAGE_TIMEOUT left
+PAGE_TIMEOUT = 10
+MIN_PAGE_TIMEOUT = 1
+
+# Length of a search snippet shown in place of a model summary
+SNIPPET_SUMMARY_TOKENS = 150
+
+# Steps recorded when a deadline forces the pipeline to degrade
+SNIPPET_NOTE = "Results shown as search snippets without a model summary"
+PAGE_NOTE = "Pages not fetched, search snippets used instead"
+SHORT_PROMPT_NOTE = "Prompts shortened"
+
+class Document(NamedTuple):
+    """A search result and the text to analyze, in flight between pipeline stages."""
+    index: int
+    result: Dict
+    content: str
+
+class BatchPacker:
+    """Greedily group documents into batches that fit a token budget as they arrive."""
+    
+    def __init__(self, token_budget: int, max_batch_size: int = 8):
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.current: List[Document] = []
+        self.current_tokens = 0
+    
+    def add(self, document: Document, tokens: int) -> Optional[List[Document]]:
+        """Add a document; returns the previous batch if the document did not fit in it."""
+        full = None
+        if self.current and (self.current_tokens + tokens > self.token_budget
+                             or len(self.current) >= self.max_batch_size):
+            full = self.flush()
+        self.current.append(document)
+        self.current_tokens += tokens
+        return full
+    
+    def flush(self) -> Optional[List[Document]]:
+        """Return the batch being filled, if any, and start a new one."""
+        batch, self.current, self.current_tokens = self.current or None, [], 0
+        return batch
+
+def _until(chunks: Iterator[str], deadline: Deadline, min_left: float) -> Iterator[str]:
+    """Yield chunks, produced on a background thread, until only min_left of the deadline is left.
+    
+    A stalled or slow model stream is cut off there instead of holding the
+    run past its deadline.
+    """
+    pieces: queue.Queue = queue.Queue()
+    done = object()
+    
+    def pump():
+        try:
+            for chunk in chunks:
+                pieces.put(chunk)
+        except Exception as e:
+            pieces.put(e)
+        pieces.put(done)
+    
+    threading.Thread(target=pump, name="stream-pump", daemon=True).start()
+    while True:
+        try:
+            piece = pieces.get(timeout=deadline.time_until(min_left))
+        except queue.Empty:
+            deadline.degrade("Summaries cut off at the deadline")
+            return
+        if piece is done:
+            return
+        if isinstance(piece, Exception):
+            raise piece
+        yield piece
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split text into chunks of at most ``max_tokens`` estimated tokens.
+    
+    Chunks end on sentence boundaries where possible, and each chunk repeats
+    roughly ``overlap_tokens`` of the previous one for context.
+    """
+    max_chars = max_tokens * 4
+    overlap_chars = overlap_tokens * 4
+    if len(text) <= max_chars:
+        return [text]
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Prefer to cut after the last sentence end, then the last space
+            window = text[start:end]
+            cuts = [match.end() for match in _SENTENCE_END.finditer(window)]
+            cut = cuts[-1] if cuts and cuts[-1] > max_chars // 2 else window.rfind(' ') + 1
+            if cut > max_chars // 2:
+                end = start + cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(end - overlap_chars, start + 1)
+        if next_start < end:
+            # Don't start the overlap in the middle of a word
+            space = text.find(' ', next_start, end)
+            next_start = space + 1 if space != -1 else next_start
+        start = next_start
+    return [chunk for chunk in chunks if chunk]
 
 class Summarizer:
-    def __init__(self):
-        self.gemini = GeminiAPI()
+    def __init__(self, max_workers: int = 4, host_delay: float = 1.0,
+                 host_delays: Optional[Dict[str, float]] = None, pool_size: int = 10,
+                 gemini: Optional[GeminiAPI] = None, combined_analysis: bool = True,
+                 batch_token_budget: int = 6000, max_batch_size: int = 8,
+                 chunk_threshold_tokens: int = 8000, chunk_tokens: int = 4000,
+                 chunk_overlap_tokens: int = 200, max_chunks: int = 16,
+                 max_content_bytes: int = 2_000_000, parser: str = 'auto'):
+        self.gemini = gemini if gemini is not None else GeminiAPI()
+        # Ask for summary and key points in one structured request per result
+        self.combined_analysis = combined_analysis
+        # Pack short documents into shared requests up to this many prompt tokens (0 disables)
+        self.batch_token_budget = batch_token_budget
+        self.max_batch_size = max_batch_size
+        # Content above the threshold is summarized chunk by chunk, then reduced
+        self.chunk_threshold_tokens = chunk_threshold_tokens
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.max_chunks = max_chunks
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.max_workers = max(1, max_workers)
+        
+        # Shared session so page fetches reuse pooled connections
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max(pool_size, self.max_workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Stop downloading pages after this many bytes
+        self.max_content_bytes = max_content_bytes
+        self.parser = resolve_parser(parser)
+        
+        # Be nice to servers: space out requests to the same host only
+        self.host_limiter = HostRateLimiter(min_interval=host_delay, host_intervals=host_delays)
 
-    def extract_content(self, url: str) -> Optional[str]:
-        """Extract main content from a URL."""
+    @metrics.timed("extract")
+    def extract_content(self, url: str, timeout: float = PAGE_TIMEOUT) -> Optional[str]:
+        """Extract main content from a URL.
+        
+        The page is streamed and only read up to ``max_content_bytes``;
+        responses that aren't HTML (PDFs, images, archives) are skipped
+        without downloading the body.
+        """
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'footer', 'header']):
-                element.decompose()
-            
-            # Extract text content
-            text = ' '.join([p.get_text().strip() for p in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])])
+            self.host_limiter.wait(url)
+            with self.session.get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                
+                content_type = response.headers.get('Content-Type')
+                if not is_html(content_type):
+                    metrics.increment("extract.skipped_non_html")
+                    print(f"Skipping {url}: unsupported content type {content_type}")
+                    return None
+                
+                body = self._read_limited(response)
+                metrics.increment("extract.bytes", len(body))
+                metrics.annotate(url=url, bytes=len(body))
+                encoding = requests.utils.get_encoding_from_headers(response.headers)
             
-            return text if text else None
+            # Without an explicit charset, assume UTF-8 rather than requests' ISO-8859-1 default
+            if encoding is None or 'charset' not in (content_type or '').lower():
+                encoding = 'utf-8'
+            return extract_text(body.decode(encoding, errors='replace'), self.parser)
             
         except Exception as e:
+            metrics.increment("extract.failures")
             print(f"Failed to extract content from {url}: {str(e)}")
             return None
 
-    def process_search_results(self, search_results: List[Dict]) -> List[Dict]:
-        """Process search results and generate summaries."""
-        processed_results = []
+    def _read_limited(self, response: requests.Response) -> bytes:
+        """Read a streamed response body, stopping after ``max_content_bytes``."""
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_content_bytes:
+                logger.info(f"Truncated {response.url} after {size} bytes")
+                break
+        return b''.join(chunks)[:self.max_content_bytes]
+
+    def get_content(self, result: Dict, deadline: Optional[Deadline] = None) -> Optional[str]:
+        """Return the text to summarize for a result: its snippet if substantial, else the page text.
         
-        for result in search_results:
-            url = result['url']
-            source = result['source']
+        With a ``deadline``, the page is only fetched while its extraction
+        share lasts and within the time left; the snippet is used otherwise.
+        """
+        snippet = result.get('snippet') or ''
+        # Skip if we already have a good snippet
+        if len(snippet) > 200:
+            return snippet
+        if deadline is None:
+            return self.extract_content(result['url'])
+        
+        timeout = min(PAGE_TIMEOUT, deadline.time_until(EXTRACT_MIN_LEFT))
+        content = self.extract_content(result['url'], timeout=timeout) if timeout >= MIN_PAGE_TIMEOUT else None
+        if content:
+            return content
+        if snippet and timeout < PAGE_TIMEOUT:
+            deadline.degrade(PAGE_NOTE)
+        return snippet or None
+
+    def analyze_result(self, result: Dict, content: str, max_retries: int = 3) -> Optional[Dict]:
+        """Summarize and extract key points for a single result's content."""
+        try:
+            if estimate_tokens(content) > self.chunk_threshold_tokens:
+                analysis = self.analyze_long_content(result['url'], content)
+                return self._build_record(result, analysis['summary'], analysis['key_points'])
             
-            # Skip if we already have a good snippet
-            if len(result['snippet']) > 200:
-                content = result['snippet']
+            # Generate summary using Gemini
+            if self.combined_analysis:
+                analysis = self.gemini.analyze_content(content, max_retries=max_retries)
+                summary, key_points = analysis['summary'], analysis['key_points']
             else:
-                content = self.extract_content(url)
-                if not content:
-                    continue
+                summary = self.gemini.generate_summary(content, max_retries=max_retries)
+                key_points = self.gemini.extract_key_points(content, max_retries=max_retries)
             
-            try:
-                # Generate summary using Gemini
-                summary = self.gemini.generate_summary(content)
-                key_points = self.gemini.extract_key_points(content)
+            return self._build_record(result, summary, key_points)
+            
+        except Exception as e:
+            print(f"Failed to process {result['url']}: {str(e)}")
+            return None
+
+    def analyze_long_content(self, url: str, content: str) -> Dict:
+        """Map-reduce summarization: summarize chunks concurrently, then combine them."""
+        chunks = chunk_text(content, self.chunk_tokens, self.chunk_overlap_tokens)
+        metrics.increment("summarize.chunks", len(chunks))
+        logger.info(f"Content from {url} is ~{estimate_tokens(content)} tokens, "
+                    f"split into {len(chunks)} chunks of <= {self.chunk_tokens} tokens")
+        if len(chunks) > self.max_chunks:
+            logger.info(f"Summarizing only the first {self.max_chunks} of {len(chunks)} chunks from {url}")
+            chunks = chunks[:self.max_chunks]
+        
+        with DaemonThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks)), thread_name_prefix="chunk") as executor:
+            chunk_summaries = list(executor.map(self.gemini.generate_summary, chunks))
+        
+        logger.info(f"Reducing {len(chunk_summaries)} chunk summaries "
+                    f"(~{sum(estimate_tokens(summary) for summary in chunk_summaries)} tokens) for {url}")
+        return self.gemini.reduce_summaries(chunk_summaries)
+
+    def _build_record(self, result: Dict, summary: str, key_points: List[str]) -> Dict:
+        return {
+            'title': result['title'],
+            'url': result['url'],
+            'source': result['source'],
+            'sources': result.get('sources', [result['source']]),
+            'summary': summary,
+            'key_points': key_points
+        }
+
+    def _snippet_record(self, result: Dict) -> Optional[Dict]:
+        """Record showing a result's search snippet in place of a model summary, or None without a snippet.
+        
+        Snippet records are marked ``snippet_only`` and are not checkpointed.
+        """
+        snippet = (result.get('snippet') or '').strip()
+        if not snippet:
+            return None
+        return dict(self._build_record(result, chunk_text(snippet, SNIPPET_SUMMARY_TOKENS)[0], []), snippet_only=True)
+
+    def snippet_records(self, search_results: List[Dict]) -> List[Dict]:
+        """Snippet records (see ``_snippet_record``) for the results that have a snippet, in order."""
+        return [record for record in map(self._snippet_record, search_results) if record]
+
+    def process_result(self, result: Dict) -> Optional[Dict]:
+        """Extract, summarize and extract key points for a single search result."""
+        content = self.get_content(result)
+        if not content:
+            return None
+        return self.analyze_result(result, content)
+
+    def _fetch_document(self, index: int, result: Dict, deadline: Optional[Deadline] = None) -> Document:
+        return Document(index, result, self.get_content(result, deadline))
+
+    def _analyze_documents(self, batch: List[Document], short: bool = False) -> List[Tuple[int, Optional[Dict]]]:
+        """Analyze a batch of documents, retrying dropped documents one by one.
+        
+        With ``short``, only the start of each document is sent and failed
+        requests are not retried, so the batch fits in what is left of a deadline.
+        """
+        max_retries = 3
+        if short:
+            batch = [document._replace(content=chunk_text(document.content, SHORT_PROMPT_TOKENS)[0]) for document in batch]
+            max_retries = 1
+        if len(batch) == 1:
+            document = batch[0]
+            return [(document.index, self.analyze_result(document.result, document.content, max_retries))]
+        
+        analyses = self.gemini.analyze_batch({str(document.index): document.content for document in batch},
+                                             max_retries=1 if short else None)
+        processed = []
+        for document in batch:
+            analysis = analyses.get(str(document.index))
+            if analysis is None:
+                record = self.analyze_result(document.result, document.content, max_retries)
+            else:
+                record = self._build_record(document.result, analysis['summary'], analysis['key_points'])
+            processed.append((document.index, record))
+        return processed
+
+    def _map(self, func, items: List) -> List:
+        """Apply func to every item on the worker pool, preserving order."""
+        if self.max_workers == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarize") as executor:
+            return list(executor.map(func, items))
+
+    def iter_search_results(self, search_results: List[Dict], checkpoint: Optional[CheckpointStore] = None,
+                            ordered: bool = False, deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Optional[Dict]]]:
+        """Yield ``(index, record)`` for every search result as it is processed.
+        
+        Fetching and analysis run as a pipeline on one pool of ``max_workers``
+        threads. At most ``2 * max_workers`` fetches and analyses are in
+        flight, new pages are only fetched once earlier work drains, and
+        each page's text is dropped as soon as it has been analyzed, so
+        memory is bounded by that window rather than by the number of
+        results. With a batch token budget, short documents are packed into
+        shared requests as they arrive.
+        
+        ``record`` is None for results that could not be processed. Records
+        come in completion order, or in the order of ``search_results`` with
+        ``ordered``. With a checkpoint, results it already holds are replayed
+        without being processed again and every new record is saved to it as
+        soon as it completes.
+        
+        With a ``deadline``, pages give way to search snippets and prompts
+        get shorter as time runs out; once the model no longer fits, and for
+        everything still in flight when the deadline's finishing share is
+        reached, the search snippet is shown instead of a summary (see
+        ``_snippet_record``).
+        """
+        if checkpoint is not None:
+            done = sum(1 for result in search_results if result['url'] in checkpoint)
+            if done:
+                print(f"Skipping {done} results already in the checkpoint")
+        
+        records = self._pipeline(search_results, checkpoint, deadline)
+        if not ordered:
+            yield from records
+            return
+        
+        # Hold back records that finish early until all results before them are done
+        waiting: Dict[int, Optional[Dict]] = {}
+        next_index = 0
+        for index, record in records:
+            waiting[index] = record
+            while next_index in waiting:
+                yield next_index, waiting.pop(next_index)
+                next_index += 1
+
+    def _pipeline(self, search_results: List[Dict], checkpoint: Optional[CheckpointStore],
+                  deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Optional[Dict]]]:
+        """Fetch and analyze search results with bounded work in flight, yielding records as they complete."""
+        batching = self.combined_analysis and self.batch_token_budget > 0
+        # Documents larger than half the budget gain little from sharing a request
+        max_doc_tokens = self.batch_token_budget // 2
+        packer = BatchPacker(self.batch_token_budget, self.max_batch_size)
+        window = 2 * self.max_workers
+        todo = iter(enumerate(search_results))
+        exhausted = False
+        fetches: Dict[Future, Tuple[int, Dict]] = {}
+        analyses: Dict[Future, List[Document]] = {}
+        
+        # Daemon workers, so requests abandoned at a deadline don't hold up exit
+        executor = DaemonThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarize")
+        
+        def schedule(batch: List[Document]) -> List[Tuple[int, Optional[Dict]]]:
+            """Submit a batch for analysis, or return snippet records once the deadline leaves no time for the model."""
+            mode = FULL if deadline is None else deadline.mode()
+            if mode == SNIPPET:
+                deadline.degrade(SNIPPET_NOTE, len(batch))
+                return [(document.index, self._snippet_record(document.result)) for document in batch]
+            if mode == SHORT:
+                deadline.degrade(SHORT_PROMPT_NOTE, len(batch))
+            analyses[executor.submit(self._analyze_documents, batch, mode == SHORT)] = batch
+            return []
+        
+        try:
+            while True:
+                # Only start new fetches while the window has room
+                while not exhausted and len(fetches) + len(analyses) < window:
+                    item = next(todo, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    index, result = item
+                    if checkpoint is not None and result['url'] in checkpoint:
+                        metrics.increment("summarize.results")
+                        yield index, checkpoint.get(result['url'])
+                        continue
+                    if deadline is not None and deadline.mode() == SNIPPET:
+                        deadline.degrade(SNIPPET_NOTE)
+                        yield index, self._snippet_record(result)
+                        continue
+                    fetches[executor.submit(self._fetch_document, index, result, deadline)] = (index, result)
                 
-                processed_results.append({
-                    'title': result['title'],
-                    'url': url,
-                    'source': source,
-                    'summary': summary,
-                    'key_points': key_points
-                })
+                if exhausted and not fetches:
+                    # No more documents are coming, so a partial batch will not fill up
+                    batch = packer.flush()
+                    if batch:
+                        yield from schedule(batch)
+                if not fetches and not analyses:
+                    break
                 
-                # Be nice to servers
-                time.sleep(1)
+                timeout = None if deadline is None else deadline.time_until(FINISH_MIN_LEFT)
+                finished, _ = wait(set(fetches) | set(analyses), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not finished:
+                    # Out of time: everything still in flight or queued is shown as its search snippet
+                    stopped = list(fetches.values())
+                    stopped += [(document.index, document.result) for batch in analyses.values() for document in batch]
+                    stopped += [(document.index, document.result) for document in packer.flush() or []]
+                    stopped += list(todo)
+                    for index, result in sorted(stopped, key=lambda item: item[0]):
+                        if checkpoint is not None and result['url'] in checkpoint:
+                            yield index, checkpoint.get(result['url'])
+                        else:
+                            deadline.degrade(SNIPPET_NOTE)
+                            yield index, self._snippet_record(result)
+                    return
                 
-            except Exception as e:
-                print(f"Failed to process {url}: {str(e)}")
-                continue
+                for future in finished:
+                    if future in analyses:
+                        del analyses[future]
+                        for index, record in future.result():
+                            if record:
+                                metrics.increment("summarize.results")
+                                if checkpoint is not None:
+                                    checkpoint.add(record)
+                            yield index, record
+                        continue
+                    
+                    del fetches[future]
+                    document = future.result()
+                    if not document.content:
+                        yield document.index, None
+                        continue
+                    tokens = estimate_tokens(document.content)
+                    if batching and tokens <= max_doc_tokens:
+                        # Documents analyzed before, alone or in another batch, don't take a batch slot
+                        analysis = self.gemini.cached_analysis(document.content)
+                        if analysis is not None:
+                            record = self._build_record(document.result, analysis['summary'], analysis['key_points'])
+                            metrics.increment("summarize.results")
+                            if checkpoint is not None:
+                                checkpoint.add(record)
+                            yield document.index, record
+                            continue
+                        batch = packer.add(document, tokens)
+                    else:
+                        batch = [document]
+                    if batch:
+                        yield from schedule(batch)
+        finally:
+            # Stop queued work if the caller stops early or the deadline is reached
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def process_search_results(self, search_results: List[Dict],
+                               checkpoint: Optional[CheckpointStore] = None) -> List[Dict]:
+        """Process search results and generate summaries.
         
-        return processed_results
+        Collects iter_search_results into a list in the order of
+        ``search_results``, leaving out results that could not be processed.
+        """
+        return [record for _, record in self.iter_search_results(search_results, checkpoint, ordered=True) if record]
 
-    def generate_report(self, processed_results: List[Dict]) -> str:
-        """Generate a formatted research report."""
-        report = "# Research Report\n\n"
+    def stream_search_results(self, search_results: List[Dict], checkpoint: Optional[CheckpointStore] = None,
+                              deadline: Optional[Deadline] = None) -> Iterator[Tuple[str, Any]]:
+        """Process results one at a time, streaming each summary as the model writes it.
         
-        for result in processed_results:
-            report += f"## {result['title']}\n"
-            report += f"Source: {result['source']} - {result['url']}\n\n"
-            
-            report += "### Summary\n"
-            report += f"{result['summary']}\n\n"
-            
-            report += "### Key Points\n"
-            for point in result['key_points']:
-                report += f"- {point}\n"
-            report += "\n---\n\n"
+        Yields ``("result", result)`` when a result starts, ``("text", chunk)``
+        for each piece of its summary and ``("record", record)`` when it is
+        done (``None`` if it failed). Pages for the following results are
+        fetched in the background and key points are requested alongside the
+        streamed summary. Long pages go through map-reduce and their summary
+        arrives in one piece; results already in the checkpoint are replayed.
+        
+        With a ``deadline``, prompts are shortened as time runs out, a
+        summary still being written when the finishing share is reached is
+        cut off there, and later results stream their search snippet.
+        """
+        fetcher = DaemonThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stream")
+        key_points_executor = DaemonThreadPoolExecutor(max_workers=1, thread_name_prefix="key-points")
+        try:
+            contents = [
+                None if checkpoint is not None and result['url'] in checkpoint
+                else fetcher.submit(self.get_content, result, deadline)
+                for result in search_results
+            ]
+            if None in contents:
+                print(f"Replaying {contents.count(None)} results already in the checkpoint")
+            for result, content in zip(search_results, contents):
+                yield "result", result
+                if content is None:
+                    record = checkpoint.get(result['url'])
+                    yield "text", record['summary']
+                    yield "record", record
+                    continue
+                
+                record = None
+                try:
+                    mode = FULL if deadline is None else deadline.mode()
+                    text = None
+                    if mode != SNIPPET:
+                        try:
+                            text = content.result(timeout=None if deadline is None else deadline.time_until(FINISH_MIN_LEFT))
+                        except FutureTimeoutError:
+                            mode = SNIPPET
+                    if mode == SNIPPET:
+                        deadline.degrade(SNIPPET_NOTE)
+                        record = self._snippet_record(result)
+                        if record:
+                            yield "text", record['summary']
+                    elif text:
+                        record = yield from self._stream_result(result, text, key_points_executor,
+                                                                deadline, short=mode == SHORT)
+                except Exception as e:
+                    print(f"Failed to process {result['url']}: {str(e)}")
+                if record and checkpoint is not None and not record.get('snippet_only'):
+                    checkpoint.add(record)
+                yield "record", record
+        finally:
+            # Stop fetching pages nobody will read if the caller stops early
+            fetcher.shutdown(wait=False, cancel_futures=True)
+            key_points_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _stream_result(self, result: Dict, content: str, key_points_executor: Executor,
+                       deadline: Optional[Deadline] = None, short: bool = False):
+        """Yield ``("text", chunk)`` events for one result's summary and return its record."""
+        max_retries = 3
+        if short:
+            deadline.degrade(SHORT_PROMPT_NOTE)
+            content = chunk_text(content, SHORT_PROMPT_TOKENS)[0]
+            max_retries = 1
+        time_left = None if deadline is None else deadline.time_until(FINISH_MIN_LEFT)
+        
+        if estimate_tokens(content) > self.chunk_threshold_tokens:
+            analysis = key_points_executor.submit(self.analyze_long_content, result['url'], content)
+            try:
+                analysis = analysis.result(timeout=time_left)
+            except FutureTimeoutError:
+                deadline.degrade(SNIPPET_NOTE)
+                record = self._snippet_record(result)
+                if record:
+                    yield "text", record['summary']
+                return record
+            yield "text", analysis['summary']
+            return self._build_record(result, analysis['summary'], analysis['key_points'])
+        
+        key_points = key_points_executor.submit(self.gemini.extract_key_points, content, max_retries)
+        chunks = self.gemini.stream_summary(content, max_retries=max_retries)
+        if deadline is not None:
+            chunks = _until(chunks, deadline, FINISH_MIN_LEFT)
+        parts = []
+        for text in chunks:
+            parts.append(text)
+            yield "text", text
+        try:
+            points = key_points.result(timeout=None if deadline is None else deadline.time_until(FINISH_MIN_LEFT))
+        except FutureTimeoutError:
+            deadline.degrade("Key points not extracted in time")
+            points = []
+        return self._build_record(result, ''.join(parts), points)
+
+    @metrics.timed("synthesize")
+    def synthesize(self, processed_results: List[Dict], threshold: Optional[float] = None,
+                   max_sources: int = 12, deadline: Optional[Deadline] = None, min_size: int = 2) -> List[Dict]:
+        """Cluster related results and synthesize each cluster in one model call.
+        
+        Results are clustered by TF-IDF similarity (``threshold`` defaults to
+        clustering.DEFAULT_SIMILARITY_THRESHOLD) and clusters of at least
+        ``min_size`` results are synthesized, one request per topic. This
+        comes on top of any per-result summaries; with snippet records (see
+        ``snippet_records``) and ``min_size=1`` every topic gets its own
+        synthesis and these are the only model calls. At most ``max_sources``
+        results of a cluster are sent to the model. Returns the clusters that were
+        synthesized, each with its ``members``, ``domains``, ``topic``,
+        ``synthesis`` and ``connections``; cross-domain clusters come first.
+        
+        With a ``deadline``, synthesis is skipped when too little time is
+        left, and clusters not synthesized by its finishing share are left out.
+        """
+        if deadline is not None and not deadline.allows(SYNTHESIS_MIN_LEFT):
+            deadline.skip("Cross-domain synthesis skipped")
+            return []
+        # Imported here so runs that never synthesize don't pay for loading scipy
+        from clustering import DEFAULT_SIMILARITY_THRESHOLD, SOURCE_DOMAINS, cluster_results
+        if threshold is None:
+            threshold = DEFAULT_SIMILARITY_THRESHOLD
+        clusters = [cluster for cluster in cluster_results(processed_results, threshold)
+                    if len(cluster['members']) >= min_size]
+        metrics.increment("synthesize.clusters", len(clusters))
+        
+        def synthesize_cluster(cluster: Dict) -> Optional[Dict]:
+            documents = []
+            for number, index in enumerate(cluster['members'][:max_sources], 1):
+                record = processed_results[index]
+                domain = SOURCE_DOMAINS.get(record['source'], record['source'])
+                documents.append(f"[SOURCE {number} | {domain}] {record['title']}\n{record['summary']}")
+            synthesis = self.gemini.synthesize_cluster(documents)
+            if synthesis is None:
+                return None
+            return dict(cluster, members=cluster['members'][:max_sources],
+                        topic=synthesis['topic'] or ', '.join(cluster['terms']),
+                        synthesis=synthesis['synthesis'], connections=synthesis['connections'])
+        
+        if deadline is None:
+            synthesized = self._map(synthesize_cluster, clusters)
+        else:
+            executor = DaemonThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="synthesize")
+            futures = [executor.submit(synthesize_cluster, cluster) for cluster in clusters]
+            wait(futures, timeout=deadline.time_until(FINISH_MIN_LEFT))
+            executor.shutdown(wait=False, cancel_futures=True)
+            late = sum(1 for future in futures if not future.done())
+            if late:
+                deadline.degrade("Topics not synthesized in time", late)
+            synthesized = [future.result() for future in futures if future.done() and not future.cancelled()]
+        synthesized = [cluster for cluster in synthesized if cluster]
+        return sorted(synthesized, key=lambda cluster: not cluster['cross_domain'])
+
+    @metrics.timed("report")
+    def generate_report(self, processed_results: List[Dict], clusters: Optional[List[Dict]] = None) -> str:
+        """Generate a formatted research report.
         
-        return report 
\ No newline at end of file
+        With ``clusters`` from synthesize, the report opens with a
+        cross-domain synthesis section. Use report.ReportWriter to write a
+        report to disk as results complete instead.
+        """
+        return ''.join(iter_report(processed_results, clusters))
@@ -1,22 +1,168 @@
 import os
-from typing import List, Dict, Optional
-from tavily import TavilyClient
-import arxiv
-import scholarly
-import wikipedia
-from pymed import PubMed
+import time
+import functools
+import importlib
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
+from types import ModuleType
+from typing import Iterator, List, Dict, Optional, Tuple
+import requests
 from dotenv import load_dotenv
 import logging
+from cache import SQLiteCache, CACHE_DIR
+from deadline import Deadline, SEARCH_MIN_LEFT
+from metrics import metrics
+from workers import DaemonThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Order in which sources are queried and merged into the result list
+SOURCES = ["tavily", "arxiv", "scholar", "wikipedia", "pubmed"]
+
+# Source adapters and the SDK module each one needs. SDKs are imported the
+# first time their source is searched, so unused SDKs are never loaded.
+# Wikipedia is queried through the MediaWiki API directly.
+SOURCE_MODULES = {
+    "tavily": "tavily",
+    "arxiv": "arxiv",
+    "scholar": "scholarly",
+    "pubmed": "pymed",
+}
+
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+# MediaWiki returns at most this many intro extracts per request
+WIKIPEDIA_MAX_EXTRACTS = 20
+USER_AGENT = "SageScope/1.0 (https://github.com/aswego123/Sagescope_crossdomain_researchagent)"
+
+def load_sdk(source: str) -> ModuleType:
+    """Import (once) and return the SDK module used by a source adapter."""
+    return importlib.import_module(SOURCE_MODULES[source])
+
+def parse_sources(value: str) -> List[str]:
+    """Parse a comma-separated list of source names, keeping the canonical order."""
+    selected = {name.strip().lower() for name in value.split(",") if name.strip()}
+    unknown = selected - set(SOURCES)
+    if unknown or not selected:
+        raise ValueError(f"Unknown sources {sorted(unknown)}, expected a comma-separated subset of {SOURCES}")
+    return [source for source in SOURCES if source in selected]
+
+# Per-source deadlines (seconds) used by the concurrent search mode
+DEFAULT_SOURCE_TIMEOUTS = {
+    "tavily": 20.0,
+    "arxiv": 20.0,
+    "scholar": 30.0,
+    "wikipedia": 15.0,
+    "pubmed": 20.0,
+}
+
+# How long cached results stay fresh per source (seconds): news goes stale
+# quickly, encyclopedic and preprint results hardly change.
+DEFAULT_CACHE_TTLS = {
+    "tavily": 6 * 3600,
+    "arxiv": 7 * 24 * 3600,
+    "scholar": 3 * 24 * 3600,
+    "wikipedia": 7 * 24 * 3600,
+    "pubmed": 3 * 24 * 3600,
+}
+
+DEFAULT_SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search_results.sqlite")
+
+# Cache modes: "use" reads and writes, "refresh" skips reads but stores fresh
+# results, "bypass" ignores the cache entirely.
+CACHE_MODES = ["use", "refresh", "bypass"]
+
+def search_cache_key(source: str, query: str, max_results: int) -> str:
+    """Build the cache key for a source query, ignoring case and extra whitespace."""
+    normalized = " ".join(query.lower().split())
+    return f"{source}:{max_results}:{normalized}"
+
+def check_cache_mode(cache_mode: str):
+    """Raise ValueError for a cache mode not in CACHE_MODES."""
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode '{cache_mode}', expected one of {CACHE_MODES}")
+
+def cached_source(source: str):
+    """Put the search cache in front of a ``search_<source>`` method.
+
+    The wrapped method takes an optional ``cache_mode`` overriding the
+    instance's for that call, so a shared instance can serve callers with
+    different cache settings.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        @metrics.timed(f"search.{source}")
+        def wrapper(self, query: str, max_results: int = 5, cache_mode: Optional[str] = None) -> List[Dict]:
+            cache_mode = self.cache_mode if cache_mode is None else cache_mode
+            if self.cache is None or cache_mode == "bypass":
+                results = method(self, query, max_results)
+                metrics.annotate(results=len(results))
+                return results
+            
+            key = search_cache_key(source, query, max_results)
+            if cache_mode != "refresh":
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info(f"{source} search served from cache")
+                    metrics.increment("search.cache_hits")
+                    metrics.annotate(results=len(cached), cached=True)
+                    return cached
+            
+            metrics.increment("search.cache_misses")
+            results = method(self, query, max_results)
+            metrics.annotate(results=len(results), cached=False)
+            # Failed searches come back empty; don't let them mask later runs
+            if results:
+                self.cache.set(key, results, ttl=self.cache_ttls.get(source))
+            return results
+        return wrapper
+    return decorator
+
 class WebSearch:
-    def __init__(self):
+    def __init__(self, source_timeouts: Optional[Dict[str, float]] = None,
+                 cache: Optional[SQLiteCache] = None, cache_mode: str = "use",
+                 cache_ttls: Optional[Dict[str, float]] = None,
+                 sources: Optional[List[str]] = None):
         load_dotenv(override=True)
-        self.tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        # Sources queried by search_all and iter_search, in canonical order
+        self.sources = [source for source in SOURCES if sources is None or source in sources]
+        self._tavily_client = None
+        self._pubmed_client = None
+        self._client_lock = threading.Lock()
+        # Shared session for sources queried over plain HTTP
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self.source_timeouts = dict(DEFAULT_SOURCE_TIMEOUTS)
+        if source_timeouts:
+            self.source_timeouts.update(source_timeouts)
+        
+        check_cache_mode(cache_mode)
+        self.cache_mode = cache_mode
+        if cache is None and cache_mode != "bypass":
+            cache = SQLiteCache(DEFAULT_SEARCH_CACHE_PATH, max_entries=2000)
+        self.cache = cache
+        self.cache_ttls = dict(DEFAULT_CACHE_TTLS)
+        if cache_ttls:
+            self.cache_ttls.update(cache_ttls)
         
+    @property
+    def tavily_client(self):
+        """Tavily client, created on first use."""
+        with self._client_lock:
+            if self._tavily_client is None:
+                self._tavily_client = load_sdk("tavily").TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+            return self._tavily_client
+
+    @property
+    def pubmed_client(self):
+        """PubMed client, created on first use and reused for every query."""
+        with self._client_lock:
+            if self._pubmed_client is None:
+                self._pubmed_client = load_sdk("pubmed").PubMed(tool="SageScope")
+            return self._pubmed_client
+
+    @cached_source("tavily")
     def search_tavily(self, query: str, max_results: int = 5) -> List[Dict]:
         """Search using Tavily API."""
         try:
@@ -31,9 +177,11 @@ class WebSearch:
             logger.error(f"Tavily search failed: {str(e)}")
             return []
 
+    @cached_source("arxiv")
     def search_arxiv(self, query: str, max_results: int = 5) -> List[Dict]:
         """Search academic papers using arXiv."""
         try:
+            arxiv = load_sdk("arxiv")
             search = arxiv.Search(
                 query=query,
                 max_results=max_results,
@@ -52,11 +200,12 @@ class WebSearch:
             logger.error(f"arXiv search failed: {str(e)}")
             return []
 
+    @cached_source("scholar")
     def search_scholar(self, query: str, max_results: int = 5) -> List[Dict]:
         """Search using Google Scholar."""
         try:
             # Use the correct method for scholarly
-            search_query = scholarly.search_pubs(query)
+            search_query = load_sdk("scholar").search_pubs(query)
             results = []
             for _ in range(max_results):
                 try:
@@ -74,33 +223,54 @@ class WebSearch:
             logger.error(f"Scholar search failed: {str(e)}")
             return []
 
+    @cached_source("wikipedia")
     def search_wikipedia(self, query: str, max_results: int = 5) -> List[Dict]:
-        """Search Wikipedia articles."""
+        """Search Wikipedia articles.
+
+        Titles, URLs and intro extracts for every hit come back from a single
+        MediaWiki query request. Disambiguation pages are skipped.
+        """
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "generator": "search",
+            "gsrsearch": query,
+            "gsrlimit": min(max_results, WIKIPEDIA_MAX_EXTRACTS),
+            "prop": "extracts|info|pageprops",
+            "exintro": 1,
+            "explaintext": 1,
+            "exlimit": "max",
+            "inprop": "url",
+            "ppprop": "disambiguation",
+        }
         try:
-            search_results = wikipedia.search(query, results=max_results)
+            response = self.session.get(WIKIPEDIA_API_URL, params=params,
+                                        timeout=self.source_timeouts["wikipedia"])
+            response.raise_for_status()
+            pages = response.json().get("query", {}).get("pages", [])
             results = []
-            for title in search_results:
-                try:
-                    page = wikipedia.page(title)
-                    results.append({
-                        "title": page.title,
-                        "url": page.url,
-                        "snippet": page.summary,
-                        "source": "wikipedia"
-                    })
-                except:
+            for page in sorted(pages, key=lambda page: page.get("index", 0)):
+                if "disambiguation" in page.get("pageprops", {}) or not page.get("extract"):
                     continue
+                results.append({
+                    "title": page["title"],
+                    "url": page["fullurl"],
+                    "snippet": page["extract"],
+                    "source": "wikipedia"
+                })
             return results
         except Exception as e:
             logger.error(f"Wikipedia search failed: {str(e)}")
             return []
 
+    @cached_source("pubmed")
     def search_pubmed(self, query: str, max_results: int = 5) -> List[Dict]:
         """Search medical research using PubMed."""
         try:
-            pubmed = PubMed()
             results = []
-            for article in pubmed.query(query, max_results=max_results):
+            # One search request for the IDs and one fetch for all records
+            for article in self.pubmed_client.query(query, max_results=max_results):
                 # Get the PMID from the article's attributes
                 pmid = getattr(article, 'pubmed_id', None)
                 if pmid:
@@ -115,15 +285,99 @@ class WebSearch:
             logger.error(f"PubMed search failed: {str(e)}")
             return []
 
-    def search_all(self, query: str, max_results: int = 5) -> List[Dict]:
-        """Search across all available sources."""
-        all_results = []
-        
-        # Search from different sources
-        all_results.extend(self.search_tavily(query, max_results))
-        all_results.extend(self.search_arxiv(query, max_results))
-        all_results.extend(self.search_scholar(query, max_results))
-        all_results.extend(self.search_wikipedia(query, max_results))
-        all_results.extend(self.search_pubmed(query, max_results))
-        
-        return all_results 
\ No newline at end of file
+    def _search_source(self, source: str, query: str, max_results: int,
+                       cache_mode: Optional[str] = None) -> List[Dict]:
+        """Dispatch a query to the search method of a single source."""
+        return getattr(self, f"search_{source}")(query, max_results, cache_mode=cache_mode)
+
+    def iter_search(self, query: str, max_results: int = 5,
+                    sources: Optional[List[str]] = None, deadline: Optional[Deadline] = None,
+                    cache_mode: Optional[str] = None) -> Iterator[Tuple[str, List[Dict]]]:
+        """Query the sources in parallel and yield ``(source, results)`` as each one finishes.
+
+        Every source gets its own deadline from ``source_timeouts``; a source
+        that misses it or fails yields an empty list. Closing the generator
+        early stops waiting for the remaining sources. ``sources`` overrides
+        the instance's selection and ``cache_mode`` its cache mode for this
+        call. With a run ``deadline``, sources still outstanding when its
+        search share is used up are cancelled.
+        """
+        if cache_mode is not None:
+            check_cache_mode(cache_mode)
+        sources = self.sources if sources is None else [source for source in SOURCES if source in sources]
+        if not sources:
+            return
+        # Daemon workers, so a source still hanging after its deadline doesn't hold up exit
+        executor = DaemonThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="search")
+        start = time.monotonic()
+        pending = {
+            executor.submit(self._search_source, source, query, max_results, cache_mode): source
+            for source in sources
+        }
+        deadlines = {source: start + self.source_timeouts[source] for source in sources}
+        cutoff = start + deadline.time_until(SEARCH_MIN_LEFT) if deadline is not None else None
+        if cutoff is not None:
+            deadlines = {source: min(limit, cutoff) for source, limit in deadlines.items()}
+
+        try:
+            while pending:
+                now = time.monotonic()
+                for future, source in list(pending.items()):
+                    if deadlines[source] <= now and not future.done():
+                        del pending[future]
+                        if cutoff is not None and deadlines[source] == cutoff:
+                            deadline.skip(f"{source} search cancelled")
+                        else:
+                            metrics.increment("search.timeouts")
+                            logger.warning(f"{source} search timed out after {self.source_timeouts[source]}s")
+                        yield source, []
+                if not pending:
+                    break
+
+                next_deadline = min(deadlines[source] for source in pending.values())
+                done, _ = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: SOURCES.index(pending[f])):
+                    source = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        logger.error(f"{source} search failed: {str(e)}")
+                        results = []
+                    yield source, results
+        finally:
+            # Don't wait for sources that missed their deadline; their calls are abandoned, not interrupted
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @metrics.timed("search")
+    def search_all(self, query: str, max_results: int = 5, concurrent: bool = True,
+                   sources: Optional[List[str]] = None, deadline: Optional[Deadline] = None,
+                   cache_mode: Optional[str] = None) -> List[Dict]:
+        """Search across the selected sources (all available ones by default).
+
+        In concurrent mode every source is queried in parallel (see
+        ``iter_search``) and a source that misses its deadline contributes no
+        results. Results are always merged in ``SOURCES`` order. With a run
+        ``deadline``, sequential mode still queries one source at a time but
+        through ``iter_search``, so a source that is still outstanding when
+        the search share is used up is cancelled like in concurrent mode.
+        ``sources`` and ``cache_mode`` override the instance's for this call.
+        """
+        if cache_mode is not None:
+            check_cache_mode(cache_mode)
+        sources = self.sources if sources is None else [source for source in SOURCES if source in sources]
+        if not concurrent:
+            all_results = []
+            for source in sources:
+                if deadline is None:
+                    all_results.extend(self._search_source(source, query, max_results, cache_mode))
+                elif not deadline.allows(SEARCH_MIN_LEFT):
+                    deadline.skip(f"{source} search cancelled")
+                else:
+                    for _, results in self.iter_search(query, max_results, sources=[source], deadline=deadline,
+                                                       cache_mode=cache_mode):
+                        all_results.extend(results)
+            return all_results
+
+        by_source = dict(self.iter_search(query, max_results, sources=sources, deadline=deadline,
+                                          cache_mode=cache_mode))
+        return [result for source in sources for result in by_source.get(source, [])]